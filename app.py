@@ -3,18 +3,37 @@ InfluenceTracker - AI-Powered YouTube Trend Analysis
 A Streamlit app for tracking influencer/competitor content and generating trend briefs.
 """
 import os
+import numpy as np
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
-from datetime import datetime
+from datetime import datetime, timezone
+from functools import partial
 import streamlit as st
 from dotenv import load_dotenv
 
 # Import our services
-from services.youtube_fetch import fetch_youtube, validate_channel_id
-from services.ai_summarize import summarize_text, configure_ai_services, rate_limit_sleep
-from services.cache_store import upsert_posts, get_recent_posts, clear_cache, load_cache
-from services.brief import aggregate_trends, compute_sentiment_mix, make_brief, format_trends_for_display
+from services.youtube_fetch import fetch_youtube, validate_channel_id, get_quota_usage, FETCH_MODES
+from services.ai_summarize import (
+    summarize_batch, summarize_batch_async, configure_ai_services,
+    get_parse_stats, STRUCTURED_OUTPUT_DEFAULT, MAX_PARALLEL_REQUESTS
+)
+from services.cache_store import (upsert_posts, clear_cache, load_cache, get_cache_meta,
+                                  known_post_ids, get_high_water_marks, update_high_water_marks,
+                                  get_window_summary, get_emerging_trends, get_trend_vocabulary,
+                                  export_posts, get_published_range)
+from services.export import EXPORT_COLUMNS, EXPORT_FORMATS, available_formats
+from services.pipeline import run_pipeline
+from services.post_columns import ColumnarPosts
+from services.trend_vocab import TrendVocabulary
+from services.summary_cache import get_summary_cache
+from services.circuit_breaker import get_circuit_breaker
+from services.text_compaction import get_compaction_stats, save_boilerplate
+from services.usage_metrics import get_usage_tracker
+from services.trend_clusters import MERGE_TRENDS_DEFAULT
+from services.rate_limiter import get_default_limits, configure_rate_limits
+from services.brief import (make_brief, format_trends_for_display, format_emerging_for_display, count_trend_ids,
+                            merge_similar_trends)
 
 # Load environment variables
 load_dotenv()
@@ -91,8 +110,50 @@ def main():
         # Settings
         st.subheader("📋 Settings")
         videos_per_channel = st.slider("Videos per channel", 1, 5, 3)
-        rate_limit_delay = st.slider("Rate limit delay (seconds)", 2, 30, 5)
+        fetch_mode = st.selectbox(
+            "YouTube fetch mode",
+            FETCH_MODES,
+            help="'search' uses search.list (~101 quota units); 'playlist' reads each channel's uploads playlist (~1 unit)"
+        )
+        gemini_rpm = st.number_input(
+            "Gemini requests/min",
+            min_value=1,
+            value=int(get_default_limits('gemini')['rpm']),
+            help="Shared across all parallel AI requests"
+        )
+        openai_rpm = st.number_input(
+            "OpenAI requests/min",
+            min_value=1,
+            value=int(get_default_limits('openai')['rpm']),
+            help="Shared across all parallel AI requests"
+        )
+        fetch_workers = st.slider("Parallel channel fetches", 1, 16, 4)
+        summarize_workers = st.slider("Parallel AI requests", 1, MAX_PARALLEL_REQUESTS, 4)
+        summarize_batch_size = st.slider(
+            "Videos per AI request", 1, 10, 5,
+            help="Gemini summarizes this many videos in one request"
+        )
+        use_async = st.checkbox(
+            "Async AI requests", value=False,
+            help="Send AI requests from one background event loop instead of a thread per request"
+        )
+        compact_text = st.checkbox(
+            "Compact video text", value=True,
+            help="Strip links, chapter lists, promo lines and channel boilerplate before sending text to the AI"
+        )
+        structured_output = st.checkbox(
+            "Structured AI output", value=STRUCTURED_OUTPUT_DEFAULT,
+            help="Ask the AI for JSON matching a fixed schema instead of parsing free text"
+        )
+        hedge_requests = st.checkbox(
+            "Hedge slow AI requests", value=False,
+            help="Also ask the other provider when a request runs past the usual (p95) latency; needs both API keys"
+        )
         ignore_old_posts = st.checkbox("Ignore old posts (>7 days)", value=True)
+        merge_trends = st.checkbox(
+            "Merge similar trends", value=MERGE_TRENDS_DEFAULT,
+            help="Count near-duplicate trends (\"gaming brand sponsorship\" / \"brand sponsorships in gaming\") as one"
+        )
         
         # Cache management
         st.subheader("🗄️ Cache")
@@ -101,10 +162,47 @@ def main():
             st.rerun()
         
         # Cache stats
-        cache = load_cache()
-        st.metric("Cached Posts", cache['meta']['total_posts'])
-        if cache['meta']['last_run']:
-            st.metric("Last Run", cache['meta']['last_run'][:19])
+        cache_meta = get_cache_meta()
+        st.metric("Cached Posts", cache_meta['total_posts'])
+        if cache_meta['last_run']:
+            st.metric("Last Run", cache_meta['last_run'][:19])
+        
+        st.metric("YouTube Quota Used", f"{get_quota_usage()['total_units']} units")
+        
+        compaction = get_compaction_stats()
+        if compaction['texts']:
+            st.caption(f"Video text: ~{compaction['tokens_before']:,} → {compaction['tokens_after']:,} tokens "
+                       f"({compaction['saved_fraction']:.0%} saved by compaction)")
+        
+        summary_stats = get_summary_cache().stats()
+        st.metric("Cached Summaries", summary_stats['entries'])
+        st.caption(f"Summary cache: {summary_stats['hits']} hits / {summary_stats['misses']} misses since server start")
+        
+        parse_stats = get_parse_stats()
+        if parse_stats['responses'] or parse_stats['batch_items']:
+            st.caption(f"AI responses: {parse_stats['failure_rate']:.0%} malformed, "
+                       f"{parse_stats['retries'] + parse_stats['batch_items_failed']} re-requests")
+        
+        # AI usage
+        last_run = get_usage_tracker().last_run()
+        if last_run and last_run['items']:
+            st.subheader("💸 AI Usage")
+            st.metric("Last Run Tokens", f"{last_run['prompt_tokens'] + last_run['completion_tokens']:,.0f}")
+            st.caption(f"~${last_run['cost_usd']:.4f} · {last_run['calls']:.0f} calls · "
+                       f"{last_run['latency_avg']:.1f}s avg · {last_run['cache_hits']} cache hits · "
+                       f"{last_run['retries']} retries · {last_run['fallbacks']} fallbacks")
+            with st.expander("Usage by channel / niche"):
+                for dimension in ('channel', 'niche', 'provider'):
+                    usage = pd.DataFrame.from_dict(get_usage_tracker().summary(dimension), orient='index')
+                    if not usage.empty:
+                        st.dataframe(usage[['items', 'calls', 'prompt_tokens', 'completion_tokens',
+                                            'cost_usd', 'latency_avg', 'cache_hits', 'retries']].round(4))
+        
+        for provider in ('gemini', 'openai'):
+            breaker_stats = get_circuit_breaker(provider).stats()
+            if breaker_stats['state'] != 'closed':
+                st.caption(f"⚡ {provider.title()} circuit {breaker_stats['state'].replace('_', '-')} "
+                           f"({breaker_stats['error_rate']:.0%} recent errors)")
     
     # Main content
     col1, col2 = st.columns([2, 1])
@@ -142,26 +240,31 @@ def main():
                 if not youtube_api_key or not gemini_api_key:
                     st.error("❌ Please provide YouTube and Gemini API keys")
                 else:
+                    configure_rate_limits('gemini', rpm=gemini_rpm)
+                    configure_rate_limits('openai', rpm=openai_rpm)
                     process_channels(channel_ids_text, niche, videos_per_channel, 
-                                  rate_limit_delay, ignore_old_posts, ai_model)
+                                  ignore_old_posts, ai_model,
+                                  fetch_workers, summarize_workers, fetch_mode,
+                                  summarize_batch_size, use_async, hedge_requests,
+                                  compact_text, structured_output)
         
         with col1_2:
             if st.button("📊 Generate Brief"):
-                generate_trend_brief()
+                generate_trend_brief(merge_trends)
         
         with col1_3:
-            if st.button("💾 Download CSV"):
+            with st.popover("💾 Download Data"):
                 download_csv()
     
     with col2:
         st.header("📈 Quick Stats")
         
-        # Load recent posts for stats
-        recent_posts = get_recent_posts(48)
+        # Rolling 48h aggregates for stats
+        recent = get_window_summary(48, merge_trends)
         
-        if recent_posts:
+        if recent['post_count']:
             # Sentiment breakdown
-            sentiment_counts = compute_sentiment_mix(recent_posts)
+            sentiment_counts = recent['sentiment_mix']
             
             st.subheader("Sentiment (48h)")
             for sentiment, count in sentiment_counts.items():
@@ -169,8 +272,8 @@ def main():
                     st.metric(sentiment.title(), count)
             
             # Top trends preview
-            if recent_posts:
-                _, top_trends = aggregate_trends(recent_posts)
+            if recent['post_count']:
+                top_trends = recent['top_trends']
                 if top_trends:
                     st.subheader("Top Trends")
                     for i, (trend, count) in enumerate(top_trends[:3], 1):
@@ -184,14 +287,16 @@ def main():
         st.header("📋 Analysis Results")
         
         # Display processed posts
-        display_results(st.session_state.processed_posts)
+        display_results(st.session_state.processed_posts, merge_trends)
         
         # Generate and display brief
         if st.session_state.processed_posts:
-            generate_trend_brief()
+            generate_trend_brief(merge_trends)
 
 
-def process_channels(channel_ids_text, niche, videos_per_channel, rate_limit_delay, ignore_old_posts, ai_model):
+def process_channels(channel_ids_text, niche, videos_per_channel, ignore_old_posts, ai_model,
+                     fetch_workers=4, summarize_workers=4, fetch_mode="search", batch_size=5,
+                     use_async=False, hedge=False, compact=True, structured=STRUCTURED_OUTPUT_DEFAULT):
     """Process YouTube channels and generate summaries."""
     # Configure AI services
     configure_ai_services()
@@ -207,53 +312,117 @@ def process_channels(channel_ids_text, niche, videos_per_channel, rate_limit_del
     if len(valid_channels) != len(channel_ids):
         st.warning(f"⚠️ {len(channel_ids) - len(valid_channels)} invalid channel IDs skipped")
     
-    # Process each channel
-    all_posts = []
+    youtube_api_key = os.getenv('YOUTUBE_API_KEY')
     progress_bar = st.progress(0)
     status_text = st.empty()
     
-    for i, channel_id in enumerate(valid_channels):
-        status_text.text(f"Processing channel {i+1}/{len(valid_channels)}: {channel_id}")
-        
-        # Fetch videos
-        videos = fetch_youtube(channel_id, os.getenv('YOUTUBE_API_KEY'), videos_per_channel)
-        
-        if videos:
-            # Process each video
-            for j, video in enumerate(videos):
-                status_text.text(f"Analyzing video {j+1}/{len(videos)} from {channel_id}")
-                
-                # Rate limiting
-                if j > 0:  # Don't sleep before first video
-                    rate_limit_sleep(rate_limit_delay)
-                
-                # Generate AI summary
-                ai_result = summarize_text(video['raw_text'], niche, ai_model)
-                
-                # Create post object
-                post = {
-                    'platform': 'YouTube',
-                    'channel_id': channel_id,
-                    'post_id': video['post_id'],
-                    'title': video['title'],
-                    'url': video['url'],
-                    'published_at': video['published_at'],
-                    'summary': ai_result['summary'],
-                    'sentiment': ai_result['sentiment'],
-                    'trends': ','.join(ai_result['trends']),
-                    'cached_at': datetime.now().isoformat(),
-                    'channel_title': video.get('channel_title', 'Unknown')
-                }
-                
-                all_posts.append(post)
-        
-        progress_bar.progress((i + 1) / len(valid_channels))
+    # Only fetch and summarize videos newer than what is already cached
+    high_water_marks = get_high_water_marks()
+    
+    def fetch(channel_id):
+        videos = fetch_youtube(channel_id, youtube_api_key, videos_per_channel, fetch_mode,
+                               since=high_water_marks.get(channel_id), compact=compact)
+        known = known_post_ids(video['post_id'] for video in videos)
+        return [video for video in videos if video['post_id'] not in known]
+    
+    # Videos whose summaries fell back to a placeholder; not cached, so they are retried
+    failed_videos = []
+    
+    def to_posts(items, ai_results):
+        posts = []
+        for channel_id, video in items:
+            ai_result = ai_results[video['post_id']]
+            if ai_result.get('fallback'):
+                failed_videos.append(dict(video, channel_id=channel_id))
+                posts.append(None)
+                continue
+            posts.append({
+                'platform': 'YouTube',
+                'channel_id': channel_id,
+                'post_id': video['post_id'],
+                'title': video['title'],
+                'url': video['url'],
+                'published_at': video['published_at'],
+                'summary': ai_result['summary'],
+                'sentiment': ai_result['sentiment'],
+                'trends': ','.join(ai_result['trends']),
+                'cached_at': datetime.now().isoformat(),
+                'channel_title': video.get('channel_title', 'Unknown')
+            })
+        return posts
+    
+    def to_items(items):
+        return [
+            {'post_id': video['post_id'], 'text': video['raw_text'], 'channel_id': channel_id}
+            for channel_id, video in items
+        ]
+    
+    def summarize(items):
+        # Generate AI summaries (batched and rate limited per provider)
+        ai_results = summarize_batch(
+            to_items(items), niche, ai_model, batch_size, hedge, run_id, structured
+        )
+        return to_posts(items, ai_results)
+    
+    # The async path runs on the background event loop, which can't call st.*;
+    # its provider warnings are shown from the script thread as progress comes in
+    ai_warnings = []
+    
+    async def summarize_async(items):
+        ai_results = await summarize_batch_async(
+            to_items(items), niche, ai_model, batch_size, hedge, run_id, structured, ai_warnings
+        )
+        return to_posts(items, ai_results)
+    
+    def show_ai_warnings():
+        while ai_warnings:
+            st.warning(ai_warnings.pop(0))
+    
+    def on_progress(progress):
+        show_ai_warnings()
+        progress_bar.progress(progress['fraction'])
+        status_text.text(
+            f"Fetched {progress['channels_done']}/{progress['channels_total']} channels, "
+            f"analyzed {progress['videos_done']}/{progress['videos_total']} videos"
+        )
+    
+    # Fetch and summarize all channels concurrently
+    usage_tracker = get_usage_tracker()
+    run_id = usage_tracker.start_run(niche)
+    all_posts = run_pipeline(valid_channels, fetch, summarize_async if use_async else summarize,
+                             fetch_workers=fetch_workers,
+                             summarize_workers=summarize_workers,
+                             videos_per_channel=videos_per_channel,
+                             batch_size=batch_size,
+                             on_progress=on_progress)
+    run_usage = usage_tracker.finish_run(run_id)
+    show_ai_warnings()
+    if compact:
+        save_boilerplate()
+    
+    if failed_videos:
+        st.warning(f"⚠️ {len(failed_videos)} videos couldn't be summarized and will be retried on the next run")
     
     # Save to cache
     if all_posts:
         upsert_posts(all_posts, ignore_old_posts)
-        st.session_state.processed_posts = all_posts
+        update_high_water_marks(all_posts, retry=failed_videos)
+        # Kept per session, so store it compactly, with trend ids for filtering
+        vocabulary = TrendVocabulary(get_trend_vocabulary().labels)
+        st.session_state.processed_posts = ColumnarPosts(
+            [dict(post, trend_ids=vocabulary.encode(post['trends'])) for post in all_posts],
+            vocabulary.labels
+        )
         st.success(f"✅ Successfully processed {len(all_posts)} videos from {len(valid_channels)} channels")
+        if run_usage['calls']:
+            st.caption(f"AI usage: {run_usage['calls']:.0f} calls, "
+                       f"{run_usage['prompt_tokens'] + run_usage['completion_tokens']:,.0f} tokens, "
+                       f"~${run_usage['cost_usd']:.4f}")
+    elif failed_videos:
+        # Already reported above
+        pass
+    elif high_water_marks:
+        st.info("ℹ️ No new videos since the last run")
     else:
         st.warning("⚠️ No videos were processed")
     
@@ -261,28 +430,63 @@ def process_channels(channel_ids_text, niche, videos_per_channel, rate_limit_del
     status_text.empty()
 
 
-def display_results(posts):
+def display_results(posts, merge_trends=MERGE_TRENDS_DEFAULT):
     """Display analysis results."""
     if not posts:
         return
     
-    # Create DataFrame
-    df = pd.DataFrame(posts)
+    st.subheader("📊 Video Analysis")
+    
+    # Filters and sorting run on the post columns; only the visible page is materialized
+    filter_cols = st.columns(4)
+    channel_titles = filter_cols[0].multiselect("Channel", posts.distinct('channel_title'), key="results_channels")
+    sentiments = filter_cols[1].multiselect("Sentiment", posts.distinct('sentiment'), key="results_sentiments")
+    trend_options = list(count_trend_ids([posts.trend_ids], posts.trend_labels).index)
+    trend = filter_cols[2].selectbox("Trend", ["All"] + trend_options, key="results_trend")
+    
+    times = posts.timestamps()
+    since = until = None
+    if not np.isnan(times).all():
+        first_day = datetime.fromtimestamp(np.nanmin(times), timezone.utc).date()
+        last_day = datetime.fromtimestamp(np.nanmax(times), timezone.utc).date()
+        date_range = filter_cols[3].date_input("Published", (first_day, last_day), key="results_dates")
+        if isinstance(date_range, (tuple, list)) and len(date_range) == 2:
+            since = datetime.combine(date_range[0], datetime.min.time(), timezone.utc)
+            until = datetime.combine(date_range[1], datetime.max.time(), timezone.utc)
+    
+    sort_cols = st.columns(4)
+    sort_labels = {'published_at': "Published", 'title': "Title", 'channel_title': "Channel", 'sentiment': "Sentiment"}
+    sort_by = sort_cols[0].selectbox("Sort by", list(sort_labels), format_func=sort_labels.get, key="results_sort")
+    descending = sort_cols[1].checkbox("Descending", value=True, key="results_descending")
+    page_size = sort_cols[2].selectbox("Rows per page", [25, 50, 100], key="results_page_size")
+    
+    rows = posts.select(channel_titles, sentiments, None if trend == "All" else trend, since, until,
+                        sort_by, descending)
+    page_count = max(1, -(-len(rows) // page_size))
+    # Narrower filters can leave the remembered page past the end
+    if st.session_state.get("results_page", 1) > page_count:
+        st.session_state["results_page"] = page_count
+    page = sort_cols[3].number_input("Page", 1, page_count, key="results_page")
+    page_rows = rows[(page - 1) * page_size:page * page_size]
     
     # Display table
-    st.subheader("📊 Video Analysis")
-    display_df = df[['title', 'sentiment', 'trends', 'url', 'channel_title']].copy()
+    display_df = posts.to_frame(['title', 'sentiment', 'trends', 'url', 'channel_title'], page_rows)
     display_df['title'] = display_df['title'].str[:60] + '...'
     display_df['trends'] = display_df['trends'].str[:50] + '...'
     
-    st.dataframe(display_df, use_container_width=True)
+    st.dataframe(display_df, use_container_width=True, hide_index=True)
+    if len(rows):
+        st.caption(f"Showing {(page - 1) * page_size + 1}–{(page - 1) * page_size + len(page_rows)} "
+                   f"of {len(rows)} videos (page {page} of {page_count})")
+    else:
+        st.caption("No videos match the filters")
     
-    # Charts
+    # Charts (all processed videos)
     col1, col2 = st.columns(2)
     
     with col1:
         # Sentiment chart
-        sentiment_counts = df['sentiment'].value_counts()
+        sentiment_counts = posts.value_counts('sentiment')
         fig_sentiment = px.bar(
             x=sentiment_counts.index,
             y=sentiment_counts.values,
@@ -293,40 +497,39 @@ def display_results(posts):
         st.plotly_chart(fig_sentiment, use_container_width=True)
     
     with col2:
-        # Trends chart
-        all_trends = []
-        for trends_str in df['trends']:
-            if trends_str:
-                trends = [t.strip() for t in trends_str.split(',') if t.strip()]
-                all_trends.extend(trends)
+        # Trends chart (normalized the same way as the brief)
+        trend_counts = count_trend_ids([posts.trend_ids], posts.trend_labels)
+        top_trends = merge_similar_trends(trend_counts, merge_trends).head(8)
         
-        if all_trends:
-            trend_counts = pd.Series(all_trends).value_counts().head(8)
+        if not top_trends.empty:
             fig_trends = px.bar(
-                x=trend_counts.values,
-                y=trend_counts.index,
+                x=top_trends.values,
+                y=top_trends.index,
                 orientation='h',
                 title="Top Trends",
-                color=trend_counts.values,
+                color=top_trends.values,
                 color_continuous_scale='viridis'
             )
             st.plotly_chart(fig_trends, use_container_width=True)
 
 
-def generate_trend_brief():
+def generate_trend_brief(merge_trends=MERGE_TRENDS_DEFAULT):
     """Generate and display trend brief."""
-    recent_posts = get_recent_posts(48)
+    recent = get_window_summary(48, merge_trends)
+    post_count = recent['post_count']
     
-    if not recent_posts:
+    if not post_count:
         st.warning("⚠️ No recent posts available for brief generation")
         return
     
-    # Analyze trends and sentiment
-    _, top_trends = aggregate_trends(recent_posts)
-    sentiment_mix = compute_sentiment_mix(recent_posts)
+    # Trends and sentiment from the rolling aggregates
+    top_trends = recent['top_trends']
+    sentiment_mix = recent['sentiment_mix']
+    
+    emerging = get_emerging_trends(merge=merge_trends)
     
     # Generate brief
-    brief = make_brief(recent_posts, top_trends, sentiment_mix)
+    brief = make_brief(post_count, top_trends, sentiment_mix, emerging)
     
     # Display results
     st.markdown('<div class="section-divider"></div>', unsafe_allow_html=True)
@@ -351,29 +554,44 @@ def generate_trend_brief():
         st.subheader("😊 Sentiment Mix")
         for sentiment, count in sentiment_mix.items():
             if count > 0:
-                percentage = (count / len(recent_posts)) * 100
+                percentage = (count / post_count) * 100
                 st.metric(sentiment.title(), f"{count} ({percentage:.1f}%)")
+    
+    # Emerging trends (last 24h against the trailing four weeks)
+    st.subheader("🚀 Emerging Trends")
+    st.text(format_emerging_for_display(emerging))
 
 
 def download_csv():
-    """Download all cached posts as CSV."""
-    cache = load_cache()
+    """Export cached posts as CSV, gzip-compressed CSV or Parquet."""
+    post_count, first, last = get_published_range()
     
-    if not cache['posts']:
+    if not post_count:
         st.warning("⚠️ No posts available for download")
         return
     
-    df = pd.DataFrame(cache['posts'])
+    formats = available_formats()
+    fmt = st.selectbox("Format", formats, format_func=lambda key: EXPORT_FORMATS[key][0], key="export_format")
+    columns = st.multiselect("Columns", list(EXPORT_COLUMNS), default=list(EXPORT_COLUMNS), key="export_columns")
+    if 'parquet' not in formats:
+        st.caption("Install pyarrow for Parquet export")
     
-    # Convert to CSV
-    csv = df.to_csv(index=False)
+    since = until = None
+    if first is not None:
+        date_range = st.date_input("Published", (first.date(), last.date()), key="export_dates")
+        if isinstance(date_range, (tuple, list)) and len(date_range) == 2:
+            since = datetime.combine(date_range[0], datetime.min.time(), timezone.utc)
+            until = datetime.combine(date_range[1], datetime.max.time(), timezone.utc)
     
-    # Download button
+    # The export is read from the storage backend in chunks, only when the button is clicked
+    _, extension, mime = EXPORT_FORMATS[fmt]
     st.download_button(
-        label="📥 Download CSV",
-        data=csv,
-        file_name=f"influence_tracker_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-        mime="text/csv"
+        label="📥 Download",
+        data=partial(export_posts, fmt, columns, since, until),
+        file_name=f"influence_tracker_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}",
+        mime=mime,
+        on_click="ignore",
+        disabled=not columns
     )
 
 
@@ -0,0 +1,64 @@
+"""
+Process-wide registry of long-lived AI provider clients.
+
+Clients are created once per (API key, model) and reused by every call, so
+their HTTP connection pools stay warm and the per-video hot path does no
+client construction or TLS handshakes.
+"""
+import os
+import threading
+from typing import Dict, Optional, Tuple
+import google.generativeai as genai
+import openai
+
+_lock = threading.Lock()
+_gemini_key: Optional[str] = None
+_gemini_models: Dict[Tuple[str, str], genai.GenerativeModel] = {}
+_openai_clients: Dict[str, openai.OpenAI] = {}
+_async_openai_clients: Dict[str, openai.AsyncOpenAI] = {}
+
+
+def configure_gemini(api_key: Optional[str] = None) -> None:
+    """Point the Gemini SDK at `api_key`, only reconfiguring when the key changes."""
+    global _gemini_key
+    api_key = api_key or os.getenv('GEMINI_API_KEY')
+    with _lock:
+        if api_key and api_key != _gemini_key:
+            genai.configure(api_key=api_key)
+            _gemini_key = api_key
+            # Models are bound to the previous key's client
+            _gemini_models.clear()
+
+
+def get_gemini_model(model_name: str, api_key: Optional[str] = None) -> genai.GenerativeModel:
+    """Return the shared GenerativeModel for `model_name`."""
+    configure_gemini(api_key)
+    with _lock:
+        key = (_gemini_key or '', model_name)
+        model = _gemini_models.get(key)
+        if model is None:
+            model = genai.GenerativeModel(model_name)
+            _gemini_models[key] = model
+        return model
+
+
+def get_openai_client(api_key: Optional[str] = None) -> openai.OpenAI:
+    """Return the shared OpenAI client (and its keep-alive connection pool) for `api_key`."""
+    api_key = api_key or os.getenv('OPENAI_API_KEY')
+    with _lock:
+        client = _openai_clients.get(api_key)
+        if client is None:
+            client = openai.OpenAI(api_key=api_key)
+            _openai_clients[api_key] = client
+        return client
+
+
+def get_async_openai_client(api_key: Optional[str] = None) -> openai.AsyncOpenAI:
+    """Return the shared AsyncOpenAI client for `api_key`, used from the background event loop."""
+    api_key = api_key or os.getenv('OPENAI_API_KEY')
+    with _lock:
+        client = _async_openai_clients.get(api_key)
+        if client is None:
+            client = openai.AsyncOpenAI(api_key=api_key)
+            _async_openai_clients[api_key] = client
+        return client
@@ -1,70 +1,498 @@
 """
 AI summarization service using Gemini (default) and OpenAI (fallback).
+
+Every entry point has a blocking and an `async` variant; both share the same
+prompts, response parsing, rate limits and summary cache. Each provider sits
+behind a circuit breaker, and requests fall back (or optionally hedge) to the
+other provider when one is failing or slow.
 """
 import os
 import json
 import time
-from typing import Dict, Optional
-import google.generativeai as genai
+import asyncio
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
 import openai
 import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from services.ai_clients import configure_gemini, get_gemini_model, get_openai_client, get_async_openai_client
+from services.rate_limiter import get_rate_limiter, is_rate_limit_error, retry_after_seconds, estimate_tokens
+from services.circuit_breaker import get_circuit_breaker, OPEN
+from services.summary_cache import get_summary_cache, make_summary_key
+from services.usage_metrics import get_usage_tracker
+from services.summary_schema import validate_summary, gemini_generation_config, openai_response_format
+
+GEMINI_MODEL = 'gemini-1.5-flash'
+OPENAI_MODEL = 'gpt-4o-mini'
+
+# Bump whenever the prompts change so cached summaries are not reused
+PROMPT_VERSION = '1'
+
+# Retries after a 429 before giving up on a request
+MAX_RATE_LIMIT_RETRIES = 3
+
+# Expected completion size, reserved from the tokens-per-minute budget
+EXPECTED_COMPLETION_TOKENS = 200
+
+# Videos packed into one Gemini request by summarize_batch
+DEFAULT_BATCH_SIZE = 5
+
+# Ask providers for schema-constrained JSON by default (AI_STRUCTURED_OUTPUT=0 to disable)
+STRUCTURED_OUTPUT_DEFAULT = os.getenv('AI_STRUCTURED_OUTPUT', '1') != '0'
+
+# Re-requests of the same provider after a malformed response
+MAX_PARSE_RETRIES = 1
+
+_parse_stats = Counter()
+_parse_lock = threading.Lock()
+
+PROVIDER_LABELS = {'gemini': 'Gemini', 'openai': 'OpenAI'}
+PROVIDER_MODELS = {'gemini': GEMINI_MODEL, 'openai': OPENAI_MODEL}
+
+# Labels (niche, run, channels) and call counts for the request being served
+_usage_scope: ContextVar[Optional[Dict]] = ContextVar('usage_scope', default=None)
+
+# Warnings from calls on the background event loop, which has no Streamlit
+# session; collected per call for the caller to show from the script thread
+_warnings: ContextVar[Optional[List[str]]] = ContextVar('warnings', default=None)
+
+# Structured-output mode of the request being served, chosen per summarize call
+_structured_output: ContextVar[bool] = ContextVar('structured_output', default=STRUCTURED_OUTPUT_DEFAULT)
+
+# Upper bound on concurrent summarize requests offered in the app
+MAX_PARALLEL_REQUESTS = 16
+
+# Threads for hedged requests, which run primary and secondary side by side:
+# two per request, so a primary never waits behind other requests
+_hedge_pool = ThreadPoolExecutor(max_workers=2 * MAX_PARALLEL_REQUESTS, thread_name_prefix='hedge')
 
 
 def configure_ai_services():
-    """Configure AI services with API keys."""
+    """Configure AI services with API keys (a no-op when the keys haven't changed)."""
     # Configure Gemini
-    gemini_key = os.getenv('GEMINI_API_KEY')
-    if gemini_key:
-        genai.configure(api_key=gemini_key)
-    
+    configure_gemini(os.getenv('GEMINI_API_KEY'))
+
     # Configure OpenAI (optional)
     openai_key = os.getenv('OPENAI_API_KEY')
     if openai_key:
         openai.api_key = openai_key
 
 
-def summarize_text(text: str, niche: str, model: str = "gemini") -> Dict:
+def _record_parse(stat: str, count: int = 1) -> None:
+    with _parse_lock:
+        _parse_stats[stat] += count
+
+
+def get_parse_stats() -> Dict:
+    """
+    Response parsing counters for this process.
+
+    Returns:
+        Dictionary with responses, parse_failures, failure_rate, retries (single
+        re-requests after a malformed response), batch_items and
+        batch_items_failed (batched items re-requested one at a time)
+    """
+    with _parse_lock:
+        stats = dict(_parse_stats)
+    responses = stats.get('responses', 0)
+    return {
+        'responses': responses,
+        'parse_failures': stats.get('parse_failures', 0),
+        'failure_rate': stats.get('parse_failures', 0) / responses if responses else 0.0,
+        'retries': stats.get('retries', 0),
+        'batch_items': stats.get('batch_items', 0),
+        'batch_items_failed': stats.get('batch_items_failed', 0)
+    }
+
+
+def _warn(message: str) -> None:
+    """st.warning, or collect the message when the caller asked for warnings to be returned."""
+    collected = _warnings.get()
+    if collected is None:
+        st.warning(message)
+    else:
+        collected.append(message)
+
+
+@contextmanager
+def _collect_warnings(warnings: Optional[List[str]]):
+    """Append the warnings raised inside the block to `warnings` (if given) instead of showing them."""
+    if warnings is None:
+        yield
+        return
+    token = _warnings.set(warnings)
+    try:
+        yield
+    finally:
+        _warnings.reset(token)
+
+
+@contextmanager
+def _output_mode(structured: bool):
+    """Use (or don't use) the providers' JSON-schema mode for the calls made inside the block."""
+    token = _structured_output.set(bool(structured))
+    try:
+        yield
+    finally:
+        _structured_output.reset(token)
+
+
+@contextmanager
+def _track_usage(niche: str, run_id: Optional[str], channel_ids: List[Optional[str]]):
+    """Attribute the provider calls made inside the block to these labels."""
+    scope = {'niche': niche, 'run_id': run_id, 'channel_ids': channel_ids, 'calls': 0, 'provider': None}
+    token = _usage_scope.set(scope)
+    try:
+        yield scope
+    finally:
+        _usage_scope.reset(token)
+
+
+def _response_usage(response, prompt: str, completions: int) -> Tuple[int, int]:
+    """(prompt, completion) tokens from the response metadata, estimated when it's missing."""
+    metadata = getattr(response, 'usage_metadata', None)
+    if metadata is not None and getattr(metadata, 'prompt_token_count', None):
+        return metadata.prompt_token_count, getattr(metadata, 'candidates_token_count', None) or 0
+    usage = getattr(response, 'usage', None)
+    if usage is not None and getattr(usage, 'prompt_tokens', None):
+        return usage.prompt_tokens, usage.completion_tokens or 0
+    return estimate_tokens(prompt), EXPECTED_COMPLETION_TOKENS * completions
+
+
+def _record_usage(provider: str, prompt: str, reserved_tokens: int, completions: int,
+                  response, latency: float) -> None:
+    """Settle the token budget with the real usage and report the call."""
+    prompt_tokens, completion_tokens = _response_usage(response, prompt, completions)
+    get_rate_limiter(provider).settle(reserved_tokens, prompt_tokens + completion_tokens)
+
+    scope = _usage_scope.get()
+    if scope is None:
+        return
+    scope['calls'] += 1
+    get_usage_tracker().record_call(
+        provider, PROVIDER_MODELS[provider], scope['niche'], scope['channel_ids'],
+        latency, prompt_tokens, completion_tokens, scope['run_id']
+    )
+
+
+def _call_with_rate_limit(provider: str, prompt: str, call: Callable, completions: int = 1):
+    """Run a provider call within its shared rate limits, retrying on 429s."""
+    limiter = get_rate_limiter(provider)
+    tokens = estimate_tokens(prompt) + EXPECTED_COMPLETION_TOKENS * completions
+
+    for attempt in range(MAX_RATE_LIMIT_RETRIES + 1):
+        limiter.acquire(tokens)
+        start = time.monotonic()
+        try:
+            response = call()
+        except Exception as e:
+            if not is_rate_limit_error(e):
+                raise
+            # The rejected call used none of its budget; the retry reserves it again
+            limiter.refund(tokens)
+            limiter.report_rate_limited(retry_after_seconds(e))
+            if attempt == MAX_RATE_LIMIT_RETRIES:
+                raise
+            continue
+        limiter.report_success()
+        _record_usage(provider, prompt, tokens, completions, response, time.monotonic() - start)
+        return response
+
+
+async def _call_with_rate_limit_async(provider: str, prompt: str, call: Callable[[], Awaitable],
+                                      completions: int = 1):
+    """Async variant of _call_with_rate_limit; waits without blocking the event loop."""
+    limiter = get_rate_limiter(provider)
+    tokens = estimate_tokens(prompt) + EXPECTED_COMPLETION_TOKENS * completions
+
+    for attempt in range(MAX_RATE_LIMIT_RETRIES + 1):
+        await limiter.acquire_async(tokens)
+        start = time.monotonic()
+        try:
+            response = await call()
+        except Exception as e:
+            if not is_rate_limit_error(e):
+                raise
+            # The rejected call used none of its budget; the retry reserves it again
+            limiter.refund(tokens)
+            limiter.report_rate_limited(retry_after_seconds(e))
+            if attempt == MAX_RATE_LIMIT_RETRIES:
+                raise
+            continue
+        limiter.report_success()
+        _record_usage(provider, prompt, tokens, completions, response, time.monotonic() - start)
+        return response
+
+
+def summarize_text(text: str, niche: str, model: str = "gemini", hedge: bool = False,
+                   structured: bool = STRUCTURED_OUTPUT_DEFAULT) -> Dict:
     """
     Summarize text using AI and extract sentiment and trends.
-    
+
+    The other provider is used when the chosen one fails or its circuit
+    breaker is open.
+
     Args:
         text: Text to summarize
         niche: Business niche for context
         model: AI model to use ("gemini" or "openai")
-        
+        hedge: Also ask the other provider once the first exceeds its p95 latency
+        structured: Ask for JSON matching the response schema
+
     Returns:
         Dictionary with summary, sentiment, and trends
     """
-    if model == "openai" and os.getenv('OPENAI_API_KEY'):
-        return _summarize_openai(text, niche)
-    else:
-        return _summarize_gemini(text, niche)
+    use_openai = _use_openai(model)
+    with _output_mode(structured):
+        results, pending = _split_cached([{'post_id': '', 'text': text}], niche, use_openai)
+        if results:
+            return results['']
+        return _summarize_item(pending[0], niche, use_openai, hedge)
 
 
-def _summarize_gemini(text: str, niche: str) -> Dict:
-    """Summarize using Google Gemini."""
-    try:
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        
-        # Enhanced niche-aware prompting
-        if niche.lower() == "gaming":
-            prompt = f"""You are an analyst for a GAMING brand team. Focus on gaming industry insights, player behavior, gaming trends, and gaming-related business opportunities.
+async def summarize_text_async(text: str, niche: str, model: str = "gemini", hedge: bool = False,
+                               structured: bool = STRUCTURED_OUTPUT_DEFAULT,
+                               warnings: Optional[List[str]] = None) -> Dict:
+    """
+    Async variant of summarize_text, built on the providers' async clients.
+
+    Pass a `warnings` list when running on a thread without a Streamlit
+    session (such as the background event loop); provider errors are
+    appended to it instead of being shown with st.warning.
+    """
+    use_openai = _use_openai(model)
+    with _collect_warnings(warnings), _output_mode(structured):
+        results, pending = _split_cached([{'post_id': '', 'text': text}], niche, use_openai)
+        if results:
+            return results['']
+        return await _summarize_item_async(pending[0], niche, use_openai, hedge)
+
+
+def summarize_batch(items: List[Dict], niche: str, model: str = "gemini",
+                    batch_size: int = DEFAULT_BATCH_SIZE, hedge: bool = False,
+                    run_id: Optional[str] = None, structured: bool = STRUCTURED_OUTPUT_DEFAULT) -> Dict[str, Dict]:
+    """
+    Summarize several videos, packing up to `batch_size` of them into one Gemini request.
+
+    Items the batched response doesn't cover (or covers with malformed JSON)
+    are retried individually. OpenAI requests are always sent one at a time.
+
+    Args:
+        items: List of dictionaries with post_id, text and optionally channel_id
+            (used to attribute token usage)
+        niche: Business niche for context
+        model: AI model to use ("gemini" or "openai")
+        batch_size: Maximum videos per request
+        hedge: Hedge single-video requests (see summarize_text)
+        run_id: Usage-tracking run from services.usage_metrics
+        structured: Ask for JSON matching the response schema
+
+    Returns:
+        Dictionary mapping post_id to a summarize_text-style result
+    """
+    with _output_mode(structured):
+        return _summarize_batch(items, niche, model, batch_size, hedge, run_id)
+
+
+def _summarize_batch(items: List[Dict], niche: str, model: str, batch_size: int, hedge: bool,
+                     run_id: Optional[str]) -> Dict[str, Dict]:
+    use_openai = _use_openai(model)
+    results, pending = _split_cached(items, niche, use_openai, run_id)
+
+    retry = pending
+    if not use_openai and batch_size > 1:
+        retry = []
+        for start in range(0, len(pending), batch_size):
+            chunk = pending[start:start + batch_size]
+            with _track_usage(niche, run_id, [item.get('channel_id') for item in chunk]):
+                parsed = _summarize_gemini_batch(chunk, niche) if len(chunk) > 1 else {}
+            retry.extend(_collect_batch(chunk, parsed, results, niche, run_id))
+
+    # Fall back to the single-item path
+    for item in retry:
+        results[item['post_id']] = _summarize_item(item, niche, use_openai, hedge, run_id)
+    return results
+
+
+async def summarize_batch_async(items: List[Dict], niche: str, model: str = "gemini",
+                                batch_size: int = DEFAULT_BATCH_SIZE, hedge: bool = False,
+                                run_id: Optional[str] = None,
+                                structured: bool = STRUCTURED_OUTPUT_DEFAULT,
+                                warnings: Optional[List[str]] = None) -> Dict[str, Dict]:
+    """
+    Async variant of summarize_batch; single-item fallbacks run concurrently.
+
+    Provider errors are appended to `warnings` when it is given (see
+    summarize_text_async).
+    """
+    with _collect_warnings(warnings), _output_mode(structured):
+        return await _summarize_batch_async(items, niche, model, batch_size, hedge, run_id)
+
+
+async def _summarize_batch_async(items: List[Dict], niche: str, model: str, batch_size: int, hedge: bool,
+                                 run_id: Optional[str]) -> Dict[str, Dict]:
+    use_openai = _use_openai(model)
+    results, pending = _split_cached(items, niche, use_openai, run_id)
+
+    retry = pending
+    if not use_openai and batch_size > 1:
+        retry = []
+        for start in range(0, len(pending), batch_size):
+            chunk = pending[start:start + batch_size]
+            with _track_usage(niche, run_id, [item.get('channel_id') for item in chunk]):
+                parsed = await _summarize_gemini_batch_async(chunk, niche) if len(chunk) > 1 else {}
+            retry.extend(_collect_batch(chunk, parsed, results, niche, run_id))
+
+    if retry:
+        retried = await asyncio.gather(*(
+            _summarize_item_async(item, niche, use_openai, hedge, run_id) for item in retry
+        ))
+        for item, result in zip(retry, retried):
+            results[item['post_id']] = result
+    return results
+
+
+def _collect_batch(chunk: List[Dict], parsed: Dict[str, Dict], results: Dict[str, Dict],
+                   niche: str, run_id: Optional[str]) -> List[Dict]:
+    """Store the parsed batch results; return the items that still need a single request."""
+    retry = []
+    for item in chunk:
+        result = parsed.get(item['post_id'])
+        if result is None:
+            retry.append(dict(item, batched=len(chunk) > 1))
+        else:
+            get_summary_cache().put(item['key'], result)
+            results[item['post_id']] = result
+            get_usage_tracker().record_item(niche, item.get('channel_id'), run_id, provider='gemini')
+    return retry
+
+
+def _summarize_item(item: Dict, niche: str, use_openai: bool, hedge: bool,
+                    run_id: Optional[str] = None) -> Dict:
+    with _track_usage(niche, run_id, [item.get('channel_id')]) as scope:
+        result = _summarize_uncached(item['text'], niche, use_openai, item['key'], hedge)
+    _record_item(item, niche, use_openai, run_id, scope, result)
+    return result
+
+
+async def _summarize_item_async(item: Dict, niche: str, use_openai: bool, hedge: bool,
+                                run_id: Optional[str] = None) -> Dict:
+    with _track_usage(niche, run_id, [item.get('channel_id')]) as scope:
+        result = await _summarize_uncached_async(item['text'], niche, use_openai, item['key'], hedge)
+    _record_item(item, niche, use_openai, run_id, scope, result)
+    return result
+
+
+def _record_item(item: Dict, niche: str, use_openai: bool, run_id: Optional[str], scope: Dict,
+                 result: Dict) -> None:
+    # A failed batch attempt counts as one wasted call for each of its items
+    retries = max(scope['calls'] - 1, 0) + int(item.get('batched', False))
+    get_usage_tracker().record_item(
+        niche, item.get('channel_id'), run_id,
+        retries=retries,
+        fallback=scope['provider'] not in (None, _providers(use_openai)[0]),
+        failed=bool(result.get('fallback')),
+        provider=scope['provider']
+    )
+
+
+def _use_openai(model: str) -> bool:
+    return bool(model == "openai" and os.getenv('OPENAI_API_KEY'))
+
+
+def _summary_key(text: str, niche: str, use_openai: bool) -> str:
+    model_name = OPENAI_MODEL if use_openai else GEMINI_MODEL
+    prompt_version = f"{PROMPT_VERSION}-schema" if _structured_output.get() else PROMPT_VERSION
+    return make_summary_key(text, niche, model_name, prompt_version)
+
+
+def _split_cached(items: List[Dict], niche: str, use_openai: bool,
+                  run_id: Optional[str] = None) -> Tuple[Dict[str, Dict], List[Dict]]:
+    """Split items into cached results and the items still to summarize (with their cache keys)."""
+    cache = get_summary_cache()
+    results = {}
+    pending = []
+    for item in items:
+        key = _summary_key(item['text'], niche, use_openai)
+        cached = cache.get(key)
+        if cached is not None:
+            results[item['post_id']] = cached
+            get_usage_tracker().record_item(niche, item.get('channel_id'), run_id, cache_hit=True)
+        else:
+            pending.append(dict(item, key=key))
+    return results, pending
+
+
+def _providers(use_openai: bool) -> List[str]:
+    """Providers to try for a request, primary first."""
+    if use_openai:
+        return ['openai', 'gemini']
+    if os.getenv('OPENAI_API_KEY'):
+        return ['gemini', 'openai']
+    return ['gemini']
+
+
+def _summarize_uncached(text: str, niche: str, use_openai: bool, key: str, hedge: bool = False) -> Dict:
+    """Call the providers and memoize the result."""
+    providers = _providers(use_openai)
+    result = _summarize_providers(text, niche, providers, hedge)
+    return _finish(text, providers, key, result)
+
+
+async def _summarize_uncached_async(text: str, niche: str, use_openai: bool, key: str,
+                                    hedge: bool = False) -> Dict:
+    providers = _providers(use_openai)
+    result = await _summarize_providers_async(text, niche, providers, hedge)
+    return _finish(text, providers, key, result)
+
+
+def _finish(text: str, providers: List[str], key: str, result: Optional[Dict]) -> Dict:
+    if result is None:
+        if all(get_circuit_breaker(provider).state == OPEN for provider in providers):
+            _warn("⚠️ AI providers are failing; skipping requests until they recover")
+        # Don't memoize placeholder results from failed calls
+        return _fallback_result(text)
+
+    get_summary_cache().put(key, result)
+    return result
+
+
+def _fallback_result(text: str) -> Dict:
+    """Placeholder result used when the AI response can't be used."""
+    return {
+        'summary': text[:300] + "..." if len(text) > 300 else text,
+        'sentiment': 'neutral',
+        'trends': [],
+        'fallback': True
+    }
+
+
+# Prompts
+
+def _gemini_prompt(text: str, niche: str) -> str:
+    # Enhanced niche-aware prompting
+    if niche.lower() == "gaming":
+        return f"""You are an analyst for a GAMING brand team. Focus on gaming industry insights, player behavior, gaming trends, and gaming-related business opportunities.
 
 Analyze this YouTube video content from a GAMING perspective and return a JSON response with exactly these keys:
 - summary: 50-80 word summary focused on GAMING aspects, player engagement, or gaming industry insights
-- sentiment: one of [positive, neutral, negative] 
+- sentiment: one of [positive, neutral, negative]
 - trends: array of 3-5 short phrases identifying GAMING trends, player preferences, or gaming industry topics
 
 Input content:
 {text}
 
 Return only valid JSON:"""
-        else:
-            prompt = f"""You are an analyst for a brand team in the '{niche}' niche. 
-        
+    else:
+        return f"""You are an analyst for a brand team in the '{niche}' niche.
+
 Analyze this YouTube video content and return a JSON response with exactly these keys:
 - summary: 50-80 word summary of the main content
-- sentiment: one of [positive, neutral, negative] 
+- sentiment: one of [positive, neutral, negative]
 - trends: array of 3-5 short phrases identifying key trends/topics
 
 Input content:
@@ -72,96 +500,349 @@ Input content:
 
 Return only valid JSON:"""
 
-        response = model.generate_content(prompt)
-        result = response.text.strip()
-        
-        # Try to extract JSON from response
-        try:
-            # Find JSON in the response
-            start = result.find('{')
-            end = result.rfind('}') + 1
-            if start != -1 and end != 0:
-                json_str = result[start:end]
-                parsed = json.loads(json_str)
-                
-                # Validate required keys
-                required_keys = ['summary', 'sentiment', 'trends']
-                if all(key in parsed for key in required_keys):
-                    return {
-                        'summary': parsed['summary'][:300],
-                        'sentiment': parsed['sentiment'].lower(),
-                        'trends': parsed['trends'][:5]
-                    }
-        except:
-            pass
-        
-        # Fallback if JSON parsing fails
-        return {
-            'summary': text[:300] + "..." if len(text) > 300 else text,
-            'sentiment': 'neutral',
-            'trends': []
-        }
-        
-    except Exception as e:
-        st.warning(f"⚠️ Gemini API error: {e}")
-        return {
-            'summary': text[:300] + "..." if len(text) > 300 else text,
-            'sentiment': 'neutral',
-            'trends': []
-        }
 
+def _gemini_batch_prompt(items: List[Dict], niche: str) -> str:
+    videos = "\n\n".join(
+        f"[VIDEO post_id={item['post_id']}]\n{item['text']}" for item in items
+    )
 
-def _summarize_openai(text: str, niche: str) -> Dict:
-    """Summarize using OpenAI GPT."""
-    try:
-        client = openai.OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
-        
-        # Enhanced niche-aware prompting for OpenAI too
-        if niche.lower() == "gaming":
-            system_prompt = "You are an analyst for a GAMING brand team. Focus on gaming industry insights, player behavior, gaming trends, and gaming-related business opportunities. Return only valid JSON."
-        else:
-            system_prompt = f"You are an analyst for a brand team in the '{niche}' niche. Return only valid JSON."
-        
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {
-                    "role": "system",
-                    "content": system_prompt
-                },
-                {
-                    "role": "user",
-                    "content": f"""Analyze this YouTube video content and return a JSON response with exactly these keys:
+    if niche.lower() == "gaming":
+        preamble = """You are an analyst for a GAMING brand team. Focus on gaming industry insights, player behavior, gaming trends, and gaming-related business opportunities.
+
+Analyze each YouTube video below from a GAMING perspective."""
+        summary_focus = "focused on GAMING aspects, player engagement, or gaming industry insights"
+        trends_focus = "GAMING trends, player preferences, or gaming industry topics"
+    else:
+        preamble = f"""You are an analyst for a brand team in the '{niche}' niche.
+
+Analyze each YouTube video below."""
+        summary_focus = "of the main content"
+        trends_focus = "key trends/topics"
+
+    return f"""{preamble} Return a JSON array with one object per video, each with exactly these keys:
+- post_id: the post_id given for the video
+- summary: 50-80 word summary {summary_focus}
+- sentiment: one of [positive, neutral, negative]
+- trends: array of 3-5 short phrases identifying {trends_focus}
+
+Videos:
+{videos}
+
+Return only a valid JSON array:"""
+
+
+def _openai_messages(text: str, niche: str) -> List[Dict]:
+    # Enhanced niche-aware prompting for OpenAI too
+    if niche.lower() == "gaming":
+        system_prompt = "You are an analyst for a GAMING brand team. Focus on gaming industry insights, player behavior, gaming trends, and gaming-related business opportunities. Return only valid JSON."
+    else:
+        system_prompt = f"You are an analyst for a brand team in the '{niche}' niche. Return only valid JSON."
+
+    user_prompt = f"""Analyze this YouTube video content and return a JSON response with exactly these keys:
 - summary: 50-80 word summary {'focused on GAMING aspects, player engagement, or gaming industry insights' if niche.lower() == 'gaming' else 'of the main content'}
-- sentiment: one of [positive, neutral, negative] 
+- sentiment: one of [positive, neutral, negative]
 - trends: array of 3-5 short phrases identifying {'GAMING trends, player preferences, or gaming industry topics' if niche.lower() == 'gaming' else 'key trends/topics'}
 
 Input content:
 {text}"""
-                }
-            ],
-            temperature=0.3
-        )
-        
-        result = response.choices[0].message.content.strip()
-        
-        try:
-            parsed = json.loads(result)
-            return {
-                'summary': parsed['summary'][:300],
-                'sentiment': parsed['sentiment'].lower(),
-                'trends': parsed['trends'][:5]
-            }
-        except:
-            return _summarize_gemini(text, niche)  # Fallback to Gemini
-            
+
+    return [
+        {
+            "role": "system",
+            "content": system_prompt
+        },
+        {
+            "role": "user",
+            "content": user_prompt
+        }
+    ]
+
+
+# Response parsing
+
+def _parse_gemini_response(result: str) -> Optional[Dict]:
+    # Find JSON in the response
+    start = result.find('{')
+    end = result.rfind('}') + 1
+    if start == -1 or end == 0:
+        return None
+    try:
+        return validate_summary(json.loads(result[start:end]))
+    except ValueError:
+        return None
+
+
+def _parse_batch_response(result: str, items: List[Dict]) -> Dict[str, Dict]:
+    start = result.find('[')
+    end = result.rfind(']') + 1
+    if start == -1 or end == 0:
+        return {}
+    try:
+        parsed = json.loads(result[start:end])
+    except ValueError:
+        return {}
+
+    results = {}
+    wanted = {item['post_id'] for item in items}
+    for entry in parsed if isinstance(parsed, list) else []:
+        if isinstance(entry, dict) and entry.get('post_id') in wanted:
+            result_item = validate_summary(entry)
+            if result_item is not None:
+                results[entry['post_id']] = result_item
+    return results
+
+
+def _parse_openai_response(result: str) -> Optional[Dict]:
+    try:
+        return validate_summary(json.loads(result))
+    except ValueError:
+        return None
+
+
+# Provider calls
+#
+# _request_* return None when the response can't be parsed and raise on API
+# errors; _attempt* wrap them with the provider's circuit breaker.
+
+def _request_gemini(text: str, niche: str) -> Optional[Dict]:
+    """Summarize using Google Gemini."""
+    model = get_gemini_model(GEMINI_MODEL)
+    prompt = _gemini_prompt(text, niche)
+    config = gemini_generation_config() if _structured_output.get() else None
+    response = _call_with_rate_limit('gemini', prompt, lambda: model.generate_content(prompt, generation_config=config))
+    return _parse_gemini_response(response.text.strip())
+
+
+async def _request_gemini_async(text: str, niche: str) -> Optional[Dict]:
+    model = get_gemini_model(GEMINI_MODEL)
+    prompt = _gemini_prompt(text, niche)
+    config = gemini_generation_config() if _structured_output.get() else None
+    response = await _call_with_rate_limit_async(
+        'gemini', prompt, lambda: model.generate_content_async(prompt, generation_config=config)
+    )
+    return _parse_gemini_response(response.text.strip())
+
+
+def _request_openai(text: str, niche: str) -> Optional[Dict]:
+    """Summarize using OpenAI GPT."""
+    client = get_openai_client()
+    messages = _openai_messages(text, niche)
+    prompt = ''.join(message['content'] for message in messages)
+
+    response = _call_with_rate_limit('openai', prompt, lambda: client.chat.completions.create(
+        model=OPENAI_MODEL,
+        messages=messages,
+        temperature=0.3,
+        **_openai_format()
+    ))
+    return _parse_openai_response(response.choices[0].message.content.strip())
+
+
+async def _request_openai_async(text: str, niche: str) -> Optional[Dict]:
+    client = get_async_openai_client()
+    messages = _openai_messages(text, niche)
+    prompt = ''.join(message['content'] for message in messages)
+
+    response = await _call_with_rate_limit_async('openai', prompt, lambda: client.chat.completions.create(
+        model=OPENAI_MODEL,
+        messages=messages,
+        temperature=0.3,
+        **_openai_format()
+    ))
+    return _parse_openai_response(response.choices[0].message.content.strip())
+
+
+def _openai_format() -> Dict:
+    return {'response_format': openai_response_format()} if _structured_output.get() else {}
+
+
+_REQUESTS = {'gemini': _request_gemini, 'openai': _request_openai}
+_ASYNC_REQUESTS = {'gemini': _request_gemini_async, 'openai': _request_openai_async}
+
+
+def _record_response(result: Optional[Dict], attempt: int) -> bool:
+    """Count a response; True when it parsed (so no retry is needed)."""
+    _record_parse('responses')
+    if attempt:
+        _record_parse('retries')
+    if result is None:
+        _record_parse('parse_failures')
+        return False
+    return True
+
+
+def _record_answer(provider: str, result: Optional[Dict]) -> None:
+    """Remember which provider answered the current request first."""
+    scope = _usage_scope.get()
+    if scope is not None and result is not None and scope['provider'] is None:
+        scope['provider'] = provider
+
+
+def _attempt(provider: str, text: str, niche: str) -> Optional[Dict]:
+    """One provider request through its circuit breaker; None if skipped, failed or unparseable."""
+    breaker = get_circuit_breaker(provider)
+    if not breaker.allow():
+        return None
+
+    try:
+        for attempt in range(MAX_PARSE_RETRIES + 1):
+            start = time.monotonic()
+            result = _REQUESTS[provider](text, niche)
+            if _record_response(result, attempt):
+                break
     except Exception as e:
-        st.warning(f"⚠️ OpenAI API error: {e}")
-        return _summarize_gemini(text, niche)  # Fallback to Gemini
+        breaker.record_failure()
+        _warn(f"⚠️ {PROVIDER_LABELS[provider]} API error: {e}")
+        return None
+    breaker.record_success(time.monotonic() - start)
+    _record_answer(provider, result)
+    return result
+
+
+async def _attempt_async(provider: str, text: str, niche: str) -> Optional[Dict]:
+    breaker = get_circuit_breaker(provider)
+    if not breaker.allow():
+        return None
+
+    try:
+        for attempt in range(MAX_PARSE_RETRIES + 1):
+            start = time.monotonic()
+            result = await _ASYNC_REQUESTS[provider](text, niche)
+            if _record_response(result, attempt):
+                break
+    except asyncio.CancelledError:
+        # Lost a hedge race; no outcome to record
+        breaker.release()
+        raise
+    except Exception as e:
+        breaker.record_failure()
+        _warn(f"⚠️ {PROVIDER_LABELS[provider]} API error: {e}")
+        return None
+    breaker.record_success(time.monotonic() - start)
+    _record_answer(provider, result)
+    return result
+
+
+def _attempt_with_context(ctx, provider: str, text: str, niche: str,
+                          started: Optional[threading.Event] = None) -> Optional[Dict]:
+    """_attempt on a hedge worker thread, attached to the caller's Streamlit session."""
+    if started is not None:
+        started.set()
+    if ctx is not None:
+        add_script_run_ctx(threading.current_thread(), ctx)
+    return _attempt(provider, text, niche)
 
 
-def rate_limit_sleep(seconds: int):
-    """Sleep for rate limiting between API calls."""
-    if seconds > 0:
-        with st.spinner(f"⏳ Waiting {seconds}s for rate limiting..."):
-            time.sleep(seconds)
+def _summarize_providers(text: str, niche: str, providers: List[str], hedge: bool) -> Optional[Dict]:
+    """
+    Try `providers` in order until one returns a usable result.
+
+    With `hedge`, the next provider is also started once the current one runs
+    past its p95 latency, and whichever answers first wins.
+    """
+    budget = get_circuit_breaker(providers[0]).latency_budget() if hedge and len(providers) > 1 else None
+    if budget is None:
+        for provider in providers:
+            result = _attempt(provider, text, niche)
+            if result is not None:
+                return result
+        return None
+
+    ctx = get_script_run_ctx()
+    remaining = list(providers)
+    # Hedge threads share the caller's usage scope
+    started = threading.Event()
+    pending = {_hedge_pool.submit(copy_context().run, _attempt_with_context, ctx, remaining.pop(0), text, niche,
+                                  started)}
+    # The latency budget runs from when the primary starts, not while it is queued
+    started.wait()
+    while pending:
+        done, pending = wait(pending, timeout=budget if remaining else None, return_when=FIRST_COMPLETED)
+        for future in done:
+            result = future.result()
+            if result is not None:
+                # The slower request keeps running and still feeds its breaker
+                return result
+        if remaining:
+            pending.add(_hedge_pool.submit(copy_context().run, _attempt_with_context, ctx,
+                                           remaining.pop(0), text, niche))
+    return None
+
+
+async def _summarize_providers_async(text: str, niche: str, providers: List[str], hedge: bool) -> Optional[Dict]:
+    budget = get_circuit_breaker(providers[0]).latency_budget() if hedge and len(providers) > 1 else None
+
+    remaining = list(providers)
+    pending = {asyncio.ensure_future(_attempt_async(remaining.pop(0), text, niche))}
+    try:
+        while pending:
+            timeout = budget if remaining else None
+            done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                result = task.result()
+                if result is not None:
+                    return result
+            if remaining:
+                pending.add(asyncio.ensure_future(_attempt_async(remaining.pop(0), text, niche)))
+    finally:
+        for task in pending:
+            task.cancel()
+    return None
+
+
+def _parse_batch(response, items: List[Dict]) -> Dict[str, Dict]:
+    parsed = _parse_batch_response(response.text.strip(), items)
+    _record_parse('batch_items', len(items))
+    _record_parse('batch_items_failed', len(items) - len(parsed))
+    return parsed
+
+
+def _summarize_gemini_batch(items: List[Dict], niche: str) -> Dict[str, Dict]:
+    """
+    Summarize several videos with one Gemini request.
+
+    Returns:
+        Dictionary mapping post_id to result for every item that parsed cleanly
+    """
+    breaker = get_circuit_breaker('gemini')
+    if not breaker.allow():
+        return {}
+
+    try:
+        model = get_gemini_model(GEMINI_MODEL)
+        prompt = _gemini_batch_prompt(items, niche)
+        config = gemini_generation_config(batch=True) if _structured_output.get() else None
+        response = _call_with_rate_limit('gemini', prompt,
+                                         lambda: model.generate_content(prompt, generation_config=config),
+                                         completions=len(items))
+    except Exception as e:
+        breaker.record_failure()
+        _warn(f"⚠️ Gemini batch error, retrying videos one at a time: {e}")
+        return {}
+    # Batch latency isn't comparable with single requests, so it stays out of the p95
+    breaker.record_success()
+    return _parse_batch(response, items)
+
+
+async def _summarize_gemini_batch_async(items: List[Dict], niche: str) -> Dict[str, Dict]:
+    breaker = get_circuit_breaker('gemini')
+    if not breaker.allow():
+        return {}
+
+    try:
+        model = get_gemini_model(GEMINI_MODEL)
+        prompt = _gemini_batch_prompt(items, niche)
+        config = gemini_generation_config(batch=True) if _structured_output.get() else None
+        response = await _call_with_rate_limit_async(
+            'gemini', prompt, lambda: model.generate_content_async(prompt, generation_config=config),
+            completions=len(items)
+        )
+    except asyncio.CancelledError:
+        breaker.release()
+        raise
+    except Exception as e:
+        breaker.record_failure()
+        _warn(f"⚠️ Gemini batch error, retrying videos one at a time: {e}")
+        return {}
+    breaker.record_success()
+    return _parse_batch(response, items)
@@ -0,0 +1,50 @@
+"""
+Background asyncio event loop for running coroutines from Streamlit's sync code.
+
+Streamlit scripts are synchronous, so one long-lived loop runs on a daemon
+thread and coroutines are handed to it with `run_async`. `BoundedRunner`
+caps how many of them are in flight at once.
+"""
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Awaitable, Callable, Optional
+
+_lock = threading.Lock()
+_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """Return the shared background event loop, starting it on first use."""
+    global _loop
+    with _lock:
+        if _loop is None or _loop.is_closed():
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=loop.run_forever, name='async-runner', daemon=True)
+            thread.start()
+            _loop = loop
+        return _loop
+
+
+def run_async(coro: Awaitable) -> Future:
+    """Schedule `coro` on the background loop and return a concurrent Future for its result."""
+    return asyncio.run_coroutine_threadsafe(coro, get_event_loop())
+
+
+class BoundedRunner:
+    """Runs coroutines on the background loop with at most `concurrency` in flight."""
+
+    def __init__(self, concurrency: int = 4):
+        self.concurrency = max(1, concurrency)
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    async def _run(self, coro_fn: Callable[..., Awaitable], args: tuple):
+        # Created inside the loop so it binds to the loop that awaits it
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        async with self._semaphore:
+            return await coro_fn(*args)
+
+    def submit(self, coro_fn: Callable[..., Awaitable], *args) -> Future:
+        """Run `coro_fn(*args)` once a slot is free; returns a concurrent Future."""
+        return run_async(self._run(coro_fn, args))
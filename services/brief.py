@@ -1,85 +1,75 @@
 """
 Trend analysis and executive brief generation.
 """
-from collections import Counter
-from typing import Dict, List, Tuple
-import streamlit as st
+from itertools import chain
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+import numpy as np
+import pandas as pd
+from services.trend_clusters import get_trend_clusterer, MERGE_TRENDS_DEFAULT
 
 
-def aggregate_trends(posts: List[Dict]) -> Tuple[Counter, List[Tuple[str, int]]]:
+def count_trend_ids(trend_ids: Iterable[Iterable[int]], vocabulary: Sequence[str]) -> pd.Series:
     """
-    Aggregate trends from posts and return top 5.
-    
+    Count stored trend ids, most common first (ties in order of first appearance).
+
     Args:
-        posts: List of post dictionaries
-        
+        trend_ids: Per-post lists of ids into `vocabulary`
+        vocabulary: Normalized trend strings, indexed by id
+
     Returns:
-        Tuple of (Counter object, list of top 5 trends with counts)
+        Series mapping trend to the number of times it appears
     """
-    all_trends = []
-    
-    for post in posts:
-        trends = post.get('trends', [])
-        if isinstance(trends, str):
-            # Handle case where trends might be stored as comma-separated string
-            trends = [t.strip() for t in trends.split(',') if t.strip()]
-        
-        # Normalize trends (lowercase, remove common prefixes)
-        normalized_trends = []
-        for trend in trends:
-            if isinstance(trend, str):
-                trend = trend.lower().strip()
-                # Remove common prefixes
-                if trend.startswith(('the ', 'a ', 'an ')):
-                    trend = trend[trend.find(' ') + 1:]
-                normalized_trends.append(trend)
-        
-        all_trends.extend(normalized_trends)
-    
-    # Count occurrences
-    trend_counter = Counter(all_trends)
-    
-    # Get top 5 trends
-    top_trends = trend_counter.most_common(5)
-    
-    return trend_counter, top_trends
+    ids = np.fromiter(chain.from_iterable(trend_ids), dtype='int64')
+    if not len(ids):
+        return pd.Series([], dtype='int64')
+
+    present, first_seen = np.unique(ids, return_index=True)
+    counts = np.bincount(ids)[present]
+    order = np.lexsort((first_seen, -counts))
+    labels = np.asarray(vocabulary, dtype=object)[present[order]]
+    return pd.Series(counts[order], index=labels, dtype='int64')
 
 
-def compute_sentiment_mix(posts: List[Dict]) -> Dict[str, int]:
+def merge_similar_trends(counts: pd.Series, merge: bool = MERGE_TRENDS_DEFAULT) -> pd.Series:
     """
-    Compute sentiment distribution across posts.
-    
+    Merge the counts of near-duplicate trends (see services.trend_clusters).
+
+    Each merged trend is labelled with its most common member. The result is
+    sorted by count, ties in the order their first member appears in `counts`.
+
     Args:
-        posts: List of post dictionaries
-        
+        counts: Series mapping normalized trend to count
+        merge: Whether to merge at all
+
     Returns:
-        Dictionary with sentiment counts
+        Series mapping trend to merged count (unchanged if `merge` is off)
     """
-    sentiment_counts = {'positive': 0, 'neutral': 0, 'negative': 0}
-    
-    for post in posts:
-        sentiment = post.get('sentiment', 'neutral').lower()
-        if sentiment in sentiment_counts:
-            sentiment_counts[sentiment] += 1
-        else:
-            sentiment_counts['neutral'] += 1
-    
-    return sentiment_counts
+    if not merge or len(counts) < 2:
+        return counts
 
+    values = counts.to_numpy(dtype='int64')
+    groups, labels = get_trend_clusterer().groups(counts.index.tolist(), values)
+    totals = np.bincount(groups, weights=values).astype('int64')
 
-def make_brief(posts: List[Dict], top_trends: List[Tuple[str, int]], sentiment_mix: Dict[str, int]) -> str:
+    merged = pd.Series(totals, index=labels, dtype='int64')
+    return merged.sort_values(ascending=False, kind='stable')
+
+
+def make_brief(posts: Union[List[Dict], int], top_trends: List[Tuple[str, int]], sentiment_mix: Dict[str, int],
+               emerging: Optional[List[Dict]] = None) -> str:
     """
     Generate an executive brief summarizing key insights.
     
     Args:
-        posts: List of post dictionaries
+        posts: List of post dictionaries, or just how many there are
         top_trends: Top 5 trends with counts
         sentiment_mix: Sentiment distribution
+        emerging: Rising trends from TrendVelocity.emerging, if any
         
     Returns:
         Executive brief as a string
     """
-    total_posts = len(posts)
+    total_posts = posts if isinstance(posts, int) else len(posts)
     
     if total_posts == 0:
         return "No recent content available for analysis."
@@ -106,6 +96,11 @@ def make_brief(posts: List[Dict], top_trends: List[Tuple[str, int]], sentiment_m
     if top_trends:
         brief_parts.append(f" The most prominent trend is '{top_trend}' (appearing in {top_count} posts), followed by '{top_trends[1][0] if len(top_trends) > 1 else ''}' and '{top_trends[2][0] if len(top_trends) > 2 else ''}'.")
     
+    # Emerging insight
+    if emerging:
+        rising = emerging[0]
+        brief_parts.append(f" Emerging: '{rising['trend']}' is up to {rising['count']} mentions in the last day from {rising['previous']} the day before ({rising['z_score']:.1f}σ above its usual level).")
+    
     # Action recommendation
     if dominant_sentiment == 'positive':
         brief_parts.append(" Consider amplifying content around these trending topics to maintain momentum.")
@@ -117,6 +112,18 @@ def make_brief(posts: List[Dict], top_trends: List[Tuple[str, int]], sentiment_m
     return " ".join(brief_parts)
 
 
+def format_emerging_for_display(emerging: List[Dict]) -> str:
+    """Format emerging trends for display in the UI."""
+    if not emerging:
+        return "No emerging trends detected"
+    
+    formatted = []
+    for i, trend in enumerate(emerging, 1):
+        formatted.append(f"{i}. {trend['trend'].title()} ({trend['count']}, {trend['velocity']:+d} vs prior day, z={trend['z_score']:.1f})")
+    
+    return "\n".join(formatted)
+
+
 def format_trends_for_display(top_trends: List[Tuple[str, int]]) -> str:
     """Format trends for display in the UI."""
     if not top_trends:
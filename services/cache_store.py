@@ -1,11 +1,62 @@
 """
-Local JSON cache storage for posts and metadata.
+Local cache storage for posts and metadata.
+
+The storage backend is chosen with the CACHE_BACKEND environment variable:
+"sqlite" (default, `data/posts.db`), "jsonl" (append-only `data/posts.jsonl`)
+or "json" (`data/posts.json`).
 """
 import os
-import json
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+import threading
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple, Union
+import pandas as pd
 import streamlit as st
+from services.post_store import PostStore, JsonPostStore, empty_cache, parse_timestamp
+from services.sqlite_store import SqlitePostStore
+from services.jsonl_store import JsonlPostStore
+from services.post_index import PostTimeIndex
+from services.post_columns import ColumnarPosts
+from services.trend_vocab import TrendVocabulary, TREND_IDS_VERSION
+from services.post_index import parse_window
+from services.rolling_aggregates import RollingAggregates
+from services.trend_velocity import TrendVelocity
+from services.trend_clusters import get_trend_clusterer, MERGE_TRENDS_DEFAULT
+from services.brief import merge_similar_trends
+from services.export import export_to_bytes, EXPORT_CHUNK_ROWS
+
+_store: Optional[PostStore] = None
+_store_lock = threading.Lock()
+
+# Serializes read-modify-write updates (duplicate check, trend vocabulary,
+# high-water marks) between sessions, which run on their own threads
+_write_lock = threading.Lock()
+
+# Process-wide snapshot of the cache, shared by every Streamlit session and
+# rerun. It is rebuilt when the write generation (bumped by our own writes) or
+# the backend's file signature (writes from other processes) changes.
+_generation = 0
+_snapshot: Optional[Dict] = None
+_snapshot_key: Optional[tuple] = None
+_index: Optional[PostTimeIndex] = None
+_index_source: Optional[Dict] = None
+_vocabulary: Optional[TrendVocabulary] = None
+_vocabulary_source: Optional[Dict] = None
+_snapshot_lock = threading.Lock()
+
+# Hourly trend/sentiment counts for recent windows and the trend event log
+# behind emerging-trend detection. Unlike the snapshot they are carried across
+# our own writes by folding in the new posts, and only rebuilt when the store
+# changes underneath us.
+AGGREGATE_RETENTION_HOURS = float(os.getenv('AGGREGATE_RETENTION_HOURS', 48))
+_aggregates: Optional[RollingAggregates] = None
+_aggregates_key: Optional[tuple] = None
+_velocity: Optional[TrendVelocity] = None
+_velocity_key: Optional[tuple] = None
+
+# Post count and publish-time bounds for the export widgets
+_published_range: Optional[tuple] = None
+_published_range_key: Optional[tuple] = None
 
 
 def ensure_data_directory():
@@ -13,42 +64,101 @@ def ensure_data_directory():
     os.makedirs('data', exist_ok=True)
 
 
+def get_store() -> PostStore:
+    """Return the configured storage backend, creating it on first use."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            ensure_data_directory()
+            backend = os.getenv('CACHE_BACKEND', 'sqlite').lower()
+            if backend == 'json':
+                _store = JsonPostStore('data/posts.json')
+            elif backend == 'jsonl':
+                _store = JsonlPostStore(
+                    'data/posts.jsonl',
+                    'data/posts_meta.json',
+                    retention_days=float(os.getenv('CACHE_RETENTION_DAYS', 30)),
+                    legacy_json_path='data/posts.json'
+                )
+            else:
+                _store = SqlitePostStore('data/posts.db', legacy_json_path='data/posts.json')
+            _migrate_trend_ids(_store)
+        return _store
+
+
+def _migrate_trend_ids(store: PostStore) -> None:
+    """Give posts cached before trend ids were stored at ingest their `trend_ids`."""
+    try:
+        if store.get_meta().get('trend_ids_version') == TREND_IDS_VERSION:
+            return
+        data = store.load()
+        if not data['posts']:
+            return
+
+        vocabulary = TrendVocabulary()
+        posts = [dict(post, trend_ids=vocabulary.encode(post.get('trends'))) for post in data['posts']]
+        meta = dict(data['meta'], trend_vocab=vocabulary.labels, trend_ids_version=TREND_IDS_VERSION)
+        store.save({'posts': posts, 'meta': meta})
+    except Exception as e:
+        st.warning(f"⚠️ Error migrating cached trends: {e}")
+
+
+def _bump_generation() -> None:
+    global _generation
+    with _snapshot_lock:
+        _generation += 1
+
+
+def get_cache_generation() -> int:
+    """Counter that changes whenever this process writes the cache."""
+    return _generation
+
+
 def load_cache() -> Dict:
-    """Load cached data from JSON file."""
-    ensure_data_directory()
-    cache_file = 'data/posts.json'
-    
-    if os.path.exists(cache_file):
-        try:
-            with open(cache_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except Exception as e:
-            st.warning(f"⚠️ Error loading cache: {e}")
-    
-    # Return default structure if file doesn't exist or is corrupted
-    return {
-        "posts": [],
-        "meta": {
-            "last_run": None,
-            "total_posts": 0,
-            "last_updated": None
-        }
-    }
+    """
+    Load all cached posts and metadata.
+
+    The result is a snapshot shared across sessions and reruns, so callers
+    must treat it as read-only. Its posts are a ColumnarPosts, whose items
+    read like the stored post dictionaries.
+    """
+    global _snapshot, _snapshot_key
+    try:
+        store = get_store()
+        key = (_generation, store.signature())
+        with _snapshot_lock:
+            if _snapshot is not None and _snapshot_key == key:
+                return _snapshot
+
+        data = store.load()
+        data = dict(data, posts=ColumnarPosts(data['posts']))
+
+        with _snapshot_lock:
+            _snapshot, _snapshot_key = data, key
+        return data
+    except Exception as e:
+        st.warning(f"⚠️ Error loading cache: {e}")
+        return dict(empty_cache(), posts=ColumnarPosts([]))
+
+
+def get_cache_meta() -> Dict:
+    """Cache metadata (post count, last run) from the shared snapshot."""
+    return load_cache()['meta']
 
 
 def save_cache(data: Dict) -> None:
-    """Save data to cache file."""
-    ensure_data_directory()
-    cache_file = 'data/posts.json'
-    
+    """Replace the cache contents with `data`."""
     try:
-        # Update metadata
+        # Update metadata (on a copy, `data` may be the shared snapshot)
+        data = dict(data, meta=dict(data['meta']))
+        if isinstance(data['posts'], ColumnarPosts):
+            data['posts'] = data['posts'].to_dicts()
         data['meta']['last_updated'] = datetime.now().isoformat()
         data['meta']['total_posts'] = len(data['posts'])
-        
-        with open(cache_file, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
-            
+
+        get_store().save(data)
+        _bump_generation()
+
     except Exception as e:
         st.error(f"❌ Error saving cache: {e}")
 
@@ -56,71 +166,332 @@ def save_cache(data: Dict) -> None:
 def upsert_posts(new_posts: List[Dict], ignore_old: bool = True) -> None:
     """
     Add new posts to cache, avoiding duplicates.
-    
+
     Args:
         new_posts: List of new post dictionaries
         ignore_old: Skip posts older than 7 days
     """
-    cache = load_cache()
-    existing_ids = {post['post_id'] for post in cache['posts']}
-    
-    # Filter out duplicates and old posts
-    posts_to_add = []
-    skipped_count = 0
-    
-    for post in new_posts:
-        if post['post_id'] in existing_ids:
-            skipped_count += 1
-            continue
-            
-        # Check if post is too old (optional)
-        if ignore_old:
-            try:
-                published_date = datetime.fromisoformat(post['published_at'].replace('Z', '+00:00'))
-                if published_date < datetime.now(published_date.tzinfo) - timedelta(days=7):
+    store = get_store()
+    with _write_lock:
+        existing_ids = store.known_ids(post['post_id'] for post in new_posts)
+
+        # Filter out duplicates and old posts
+        posts_to_add = []
+        skipped_count = 0
+        old_cutoff = datetime.now(timezone.utc) - timedelta(days=7)
+
+        for post in new_posts:
+            if post['post_id'] in existing_ids:
+                skipped_count += 1
+                continue
+
+            # Check if post is too old (optional)
+            if ignore_old:
+                published_date = parse_timestamp(post.get('published_at'))
+                # If date parsing fails, include the post
+                if published_date is not None and published_date < old_cutoff:
                     skipped_count += 1
                     continue
-            except:
-                pass  # If date parsing fails, include the post
-        
-        posts_to_add.append(post)
-    
-    # Add new posts
-    cache['posts'].extend(posts_to_add)
-    
-    # Update metadata
-    cache['meta']['last_run'] = datetime.now().isoformat()
-    
-    # Save updated cache
-    save_cache(cache)
-    
+
+            existing_ids.add(post['post_id'])
+            posts_to_add.append(post)
+
+        # Store canonical trend ids alongside the raw trend string. The
+        # dictionary is read from the store, not the snapshot, so ids handed
+        # out by another session's upsert are never reused
+        vocabulary = TrendVocabulary(store.get_meta().get('trend_vocab'))
+        vocabulary_size = len(vocabulary)
+        posts_to_add = [dict(post, trend_ids=vocabulary.encode(post.get('trends'))) for post in posts_to_add]
+
+        now = datetime.now().isoformat()
+        meta_updates = {'last_run': now, 'last_updated': now, 'trend_ids_version': TREND_IDS_VERSION}
+        if len(vocabulary) != vocabulary_size:
+            meta_updates['trend_vocab'] = vocabulary.labels
+        try:
+            key_before = (_generation, store.signature())
+            store.add_posts(posts_to_add, meta_updates)
+            _bump_generation()
+            _advance_derived(key_before, posts_to_add, vocabulary)
+        except Exception as e:
+            st.error(f"❌ Error saving cache: {e}")
+
     if skipped_count > 0:
         st.info(f"ℹ️ Skipped {skipped_count} duplicate/old posts")
 
 
-def get_recent_posts(hours: int = 48) -> List[Dict]:
-    """Get posts from the last N hours."""
-    cache = load_cache()
-    cutoff_time = datetime.now() - timedelta(hours=hours)
+def known_post_ids(post_ids: Iterable[str]) -> Set[str]:
+    """Return the subset of `post_ids` that is already cached."""
+    try:
+        return get_store().known_ids(post_ids)
+    except Exception as e:
+        st.warning(f"⚠️ Error loading cache: {e}")
+        return set()
+
+
+def get_high_water_marks() -> Dict[str, Dict]:
+    """
+    Newest cached video per channel.
     
-    recent_posts = []
-    for post in cache['posts']:
-        try:
-            published_date = datetime.fromisoformat(post['published_at'].replace('Z', '+00:00'))
-            if published_date >= cutoff_time:
-                recent_posts.append(post)
-        except:
-            # If date parsing fails, include the post
-            recent_posts.append(post)
+    Returns:
+        Dictionary mapping channel ID to {"published_at": ..., "post_id": ...}
+    """
+    # Channels cached before marks were tracked fall back to their newest post
+    marks = {
+        channel_id: {'published_at': post['published_at'], 'post_id': post['post_id']}
+        for channel_id, post in get_post_index().latest_per_channel().items()
+    }
+    marks.update(load_cache()['meta'].get('high_water_marks') or {})
+    return marks
+
+
+def update_high_water_marks(posts: List[Dict], retry: Iterable[Dict] = ()) -> None:
+    """
+    Advance each channel's high-water mark to the newest of `posts`.
+
+    Args:
+        posts: Posts just cached
+        retry: Fetched videos that weren't cached (e.g. failed summaries);
+            their channels' marks are held back so the next run fetches them again
+    """
+    with _write_lock:
+        marks = dict(get_high_water_marks())
+        changed = False
     
-    return recent_posts
+        for post in posts:
+            published = parse_timestamp(post.get('published_at'))
+            if published is None or not post.get('channel_id'):
+                continue
+            mark = marks.get(post['channel_id'])
+            if mark is None or published > parse_timestamp(mark['published_at']):
+                marks[post['channel_id']] = {'published_at': post['published_at'], 'post_id': post['post_id']}
+                changed = True
+
+        for video in retry:
+            published = parse_timestamp(video.get('published_at'))
+            mark = marks.get(video.get('channel_id'))
+            if published is None or mark is None or published > parse_timestamp(mark['published_at']):
+                continue
+            # Fetching stops only at videos strictly older than the mark
+            marks[video['channel_id']] = {'published_at': video['published_at'], 'post_id': None}
+            changed = True
+    
+        if not changed:
+            return
+        try:
+            store = get_store()
+            key_before = (_generation, store.signature())
+            store.update_meta({'high_water_marks': marks})
+            _bump_generation()
+            _advance_derived(key_before)
+        except Exception as e:
+            st.error(f"❌ Error saving cache: {e}")
+
+
+def get_post_index() -> PostTimeIndex:
+    """Return the time index for the current cache snapshot, rebuilding it after writes."""
+    global _index, _index_source
+    snapshot = load_cache()
+    with _snapshot_lock:
+        if _index is not None and _index_source is snapshot:
+            return _index
+
+    index = PostTimeIndex(snapshot['posts'])
+
+    with _snapshot_lock:
+        _index, _index_source = index, snapshot
+    return index
+
+
+def get_trend_vocabulary() -> TrendVocabulary:
+    """Trend dictionary for the current cache snapshot (treat as read-only)."""
+    global _vocabulary, _vocabulary_source
+    snapshot = load_cache()
+    with _snapshot_lock:
+        if _vocabulary is not None and _vocabulary_source is snapshot:
+            return _vocabulary
+
+    vocabulary = TrendVocabulary(snapshot['meta'].get('trend_vocab'))
+
+    with _snapshot_lock:
+        _vocabulary, _vocabulary_source = vocabulary, snapshot
+    return vocabulary
+
+
+def _advance_derived(key_before: tuple, posts: List[Dict] = (),
+                     vocabulary: Optional[TrendVocabulary] = None) -> None:
+    """Fold posts we just wrote into the aggregates and trend log that were current before the write."""
+    global _aggregates_key, _velocity_key
+    key = (_generation, get_store().signature())
+    with _snapshot_lock:
+        if _aggregates is not None and _aggregates_key == key_before:
+            _aggregates.add_posts(posts, vocabulary)
+            _aggregates_key = key
+        if _velocity is not None and _velocity_key == key_before:
+            _velocity.add_posts(posts, vocabulary)
+            _velocity_key = key
+
+
+def get_rolling_aggregates() -> RollingAggregates:
+    """Hourly aggregates for the current cache contents, built from the snapshot when stale."""
+    global _aggregates, _aggregates_key
+    key = (_generation, get_store().signature())
+    with _snapshot_lock:
+        if _aggregates is not None and _aggregates_key == key:
+            return _aggregates
+
+    index = get_post_index()
+    aggregates = RollingAggregates.from_posts(index.posts + index.undated, get_trend_vocabulary(),
+                                              retention=AGGREGATE_RETENTION_HOURS)
+
+    with _snapshot_lock:
+        _aggregates, _aggregates_key = aggregates, key
+    return aggregates
+
+
+def get_window_summary(hours: Union[int, float, str] = 48, merge: bool = MERGE_TRENDS_DEFAULT) -> Dict:
+    """
+    Post count, sentiment mix and trend counts for a recent time window.
+
+    Windows within the aggregate retention are answered from the hourly
+    buckets plus the posts of the partial hour at the window start; longer
+    ones fall back to scanning the window's posts.
+
+    Args:
+        hours: Window size in hours, or a string such as "6h", "24h" or "2d"
+        merge: Merge near-duplicate trends
+
+    Returns:
+        Dictionary with post_count, sentiment_mix, trend_counts (a Counter)
+        and top_trends (the 5 most common)
+    """
+    try:
+        now = datetime.now(timezone.utc)
+        vocabulary = get_trend_vocabulary()
+        if parse_window(hours) > timedelta(hours=AGGREGATE_RETENTION_HOURS):
+            aggregates = RollingAggregates.from_posts(get_recent_posts(hours), vocabulary, retention=hours)
+        else:
+            aggregates = get_rolling_aggregates()
+        since, until = RollingAggregates.boundary(hours, now)
+        boundary_posts = get_post_index().window(since, until, include_undated=False)
+        summary = aggregates.window(hours, boundary_posts, vocabulary, now)
+    except ValueError:
+        raise
+    except Exception as e:
+        st.warning(f"⚠️ Error loading cache: {e}")
+        summary = RollingAggregates().window()
+    counts = merge_similar_trends(pd.Series(summary['trend_counts'], dtype='int64'), merge)
+    summary['trend_counts'] = Counter(dict(zip(counts.index, counts.tolist())))
+    summary['top_trends'] = summary['trend_counts'].most_common(5)
+    return summary
+
+
+def get_trend_velocity() -> TrendVelocity:
+    """Trend event log for the current cache contents, built from the snapshot when stale."""
+    global _velocity, _velocity_key
+    key = (_generation, get_store().signature())
+    with _snapshot_lock:
+        if _velocity is not None and _velocity_key == key:
+            return _velocity
+
+    velocity = TrendVelocity.from_posts(load_cache()['posts'], get_trend_vocabulary())
+
+    with _snapshot_lock:
+        _velocity, _velocity_key = velocity, key
+    return velocity
+
+
+def get_emerging_trends(top: int = 5, merge: bool = MERGE_TRENDS_DEFAULT) -> List[Dict]:
+    """
+    Trends whose latest 24h count is well above their trailing baseline.
+
+    Near-duplicate trends are scored together when `merge` is on.
+
+    Returns:
+        List of dictionaries with trend, count, previous, velocity,
+        acceleration and z_score (see TrendVelocity.emerging)
+    """
+    try:
+        labels = get_trend_vocabulary().labels
+        velocity = get_trend_velocity()
+        if merge and labels:
+            # Label merged trends by their most mentioned member, as in merge_similar_trends
+            mentions = velocity.window_counts(len(labels)).sum(axis=0)
+            groups, group_labels = get_trend_clusterer().groups(labels, mentions)
+            return velocity.emerging(group_labels, groups, top=top)
+        return velocity.emerging(labels, top=top)
+    except Exception as e:
+        st.warning(f"⚠️ Error detecting emerging trends: {e}")
+        return []
+
+
+def get_recent_posts(hours: Union[int, float, str] = 48,
+                     channel_ids: Optional[Union[str, Iterable[str]]] = None) -> List[Dict]:
+    """
+    Get posts published within a time window.
+
+    Args:
+        hours: Window size in hours, or a string such as "6h", "24h" or "7d"
+        channel_ids: Optionally restrict to one channel ID or a collection of them
+
+    Returns:
+        List of post dictionaries, oldest first
+    """
+    try:
+        return get_post_index().recent(hours, channel_ids)
+    except ValueError:
+        raise
+    except Exception as e:
+        st.warning(f"⚠️ Error loading cache: {e}")
+        return []
+
+
+def export_posts(fmt: str = 'csv', columns: Optional[Sequence[str]] = None,
+                 since: Optional[datetime] = None, until: Optional[datetime] = None) -> bytes:
+    """
+    Export cached posts straight from the storage backend, chunk by chunk.
+
+    Args:
+        fmt: 'csv', 'csv.gz' or 'parquet' (see services.export)
+        columns: Fields to export, in order (defaults to every exported field)
+        since: Only posts published at or after this time
+        until: Only posts published at or before this time
+
+    Returns:
+        The exported file's contents
+    """
+    chunks = get_store().iter_posts(since, until, EXPORT_CHUNK_ROWS)
+    return export_to_bytes(chunks, fmt, columns)
+
+
+def get_published_range() -> Tuple[int, Optional[datetime], Optional[datetime]]:
+    """
+    Number of stored posts and their earliest and latest publish times, from the backend.
+
+    Cached until the store changes, so export widgets don't rescan it on every rerun.
+    """
+    global _published_range, _published_range_key
+    try:
+        store = get_store()
+        key = (_generation, store.signature())
+        with _snapshot_lock:
+            if _published_range is not None and _published_range_key == key:
+                return _published_range
+
+        published_range = store.published_range()
+
+        with _snapshot_lock:
+            _published_range, _published_range_key = published_range, key
+        return published_range
+    except Exception as e:
+        st.warning(f"⚠️ Error loading cache: {e}")
+        return 0, None, None
 
 
 def clear_cache() -> None:
     """Clear all cached data."""
-    cache_file = 'data/posts.json'
-    if os.path.exists(cache_file):
-        os.remove(cache_file)
+    cleared = get_store().clear()
+    _bump_generation()
+    if cleared:
         st.success("🗑️ Cache cleared successfully")
     else:
         st.info("ℹ️ No cache file to clear")
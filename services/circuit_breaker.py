@@ -0,0 +1,140 @@
+"""
+Per-provider circuit breakers for AI calls.
+
+A breaker opens after repeated failures so requests skip a provider that is
+down instead of waiting for it to time out, then half-opens after a cooldown
+to let a single probe request through. It also keeps recent latencies, whose
+p95 is the budget for hedged requests.
+"""
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# Open after this many consecutive failures...
+FAILURE_THRESHOLD = 5
+# ...or when at least this share of the recent outcomes failed
+ERROR_RATE_THRESHOLD = 0.5
+OUTCOME_WINDOW = 20
+MIN_OUTCOMES = 10
+
+# Seconds to stay open before letting a probe through
+RESET_TIMEOUT = 30.0
+
+# Latency samples kept, and the minimum needed before a budget is reported
+LATENCY_WINDOW = 100
+MIN_LATENCY_SAMPLES = 10
+
+
+class CircuitBreaker:
+    """Closed / open / half-open breaker with a rolling error rate and latency window."""
+
+    def __init__(self, provider: str):
+        self.provider = provider
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probing = False
+        self._consecutive_failures = 0
+        self._outcomes = deque(maxlen=OUTCOME_WINDOW)
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= RESET_TIMEOUT:
+                return HALF_OPEN
+            return self._state
+
+    def allow(self) -> bool:
+        """Whether a request may be sent now; in half-open state only one probe is let through."""
+        with self._lock:
+            if self._state == OPEN:
+                if time.monotonic() - self._opened_at < RESET_TIMEOUT:
+                    return False
+                self._state = HALF_OPEN
+                self._probing = False
+            if self._state == HALF_OPEN:
+                if self._probing:
+                    return False
+                self._probing = True
+            return True
+
+    def record_success(self, latency: Optional[float] = None) -> None:
+        """Record a successful call (and its latency in seconds, when comparable)."""
+        with self._lock:
+            self._consecutive_failures = 0
+            self._outcomes.append(True)
+            if latency is not None:
+                self._latencies.append(latency)
+            if self._state == HALF_OPEN:
+                self._state = CLOSED
+                self._probing = False
+                self._outcomes.clear()
+
+    def record_failure(self) -> None:
+        """Record a failed call, opening the breaker when the thresholds are crossed."""
+        with self._lock:
+            self._consecutive_failures += 1
+            self._outcomes.append(False)
+            failures = self._outcomes.count(False)
+            if (self._state == HALF_OPEN
+                    or self._consecutive_failures >= FAILURE_THRESHOLD
+                    or (len(self._outcomes) >= MIN_OUTCOMES
+                        and failures / len(self._outcomes) >= ERROR_RATE_THRESHOLD)):
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+    def release(self) -> None:
+        """Give back a half-open probe slot that ended without an outcome (e.g. cancelled)."""
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._probing = False
+
+    def latency_budget(self, percentile: float = 0.95) -> Optional[float]:
+        """Recent latency percentile in seconds, or None until there are enough samples."""
+        with self._lock:
+            samples = sorted(self._latencies)
+        if len(samples) < MIN_LATENCY_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, int(percentile * len(samples)))]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._state = CLOSED
+            self._probing = False
+            self._consecutive_failures = 0
+            self._outcomes.clear()
+            self._latencies.clear()
+
+    def stats(self) -> Dict:
+        """Snapshot of the breaker for display."""
+        state = self.state
+        with self._lock:
+            outcomes = list(self._outcomes)
+        budget = self.latency_budget()
+        return {
+            'provider': self.provider,
+            'state': state,
+            'error_rate': outcomes.count(False) / len(outcomes) if outcomes else 0.0,
+            'p95_latency': budget
+        }
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_registry_lock = threading.Lock()
+
+
+def get_circuit_breaker(provider: str) -> CircuitBreaker:
+    """Return the process-wide breaker for a provider, creating it on first use."""
+    with _registry_lock:
+        breaker = _breakers.get(provider)
+        if breaker is None:
+            breaker = CircuitBreaker(provider)
+            _breakers[provider] = breaker
+        return breaker
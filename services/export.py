@@ -0,0 +1,108 @@
+"""
+Streaming export of cached posts to CSV, gzip-compressed CSV or Parquet.
+
+Posts are read from the storage backend in chunks and each chunk is encoded
+before the next one is read, so only the encoded output, not the post
+dictionaries, is held for the whole cache. Parquet needs the optional
+`pyarrow` package and is only offered when it is installed.
+"""
+import gzip
+import io
+import os
+from typing import BinaryIO, Dict, Iterable, List, Optional, Sequence
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+# Posts read from the backend per chunk
+EXPORT_CHUNK_ROWS = int(os.getenv('EXPORT_CHUNK_ROWS', 1000))
+
+# Exported fields in column order (trend_ids only make sense with the
+# cache's trend dictionary, so they are left out)
+EXPORT_COLUMNS = ('platform', 'channel_id', 'channel_title', 'post_id', 'title', 'url', 'published_at',
+                  'summary', 'sentiment', 'trends', 'cached_at')
+
+# Format key -> (label, file extension, MIME type)
+EXPORT_FORMATS = {
+    'csv': ('CSV', 'csv', 'text/csv'),
+    'csv.gz': ('CSV (gzip)', 'csv.gz', 'application/gzip'),
+    'parquet': ('Parquet', 'parquet', 'application/vnd.apache.parquet'),
+}
+
+
+def available_formats() -> List[str]:
+    """Export formats usable in this environment."""
+    return [fmt for fmt in EXPORT_FORMATS if fmt != 'parquet' or pq is not None]
+
+
+def _cell(value) -> Optional[str]:
+    return None if value is None else str(value)
+
+
+def _write_csv(chunks: Iterable[List[Dict]], out: BinaryIO, columns: List[str], compress: bool) -> int:
+    binary = gzip.GzipFile(fileobj=out, mode='wb', mtime=0) if compress else out
+    text = io.TextIOWrapper(binary, encoding='utf-8', newline='')
+    rows = 0
+    try:
+        pd.DataFrame(columns=columns).to_csv(text, index=False)
+        for chunk in chunks:
+            pd.DataFrame(chunk, columns=columns).to_csv(text, header=False, index=False)
+            rows += len(chunk)
+    finally:
+        # Leave `out` open for the caller
+        text.flush()
+        text.detach()
+        if compress:
+            binary.close()
+    return rows
+
+
+def _write_parquet(chunks: Iterable[List[Dict]], out: BinaryIO, columns: List[str]) -> int:
+    if pq is None:
+        raise ValueError("Parquet export requires the pyarrow package")
+    # Every field is written as a string so chunks share one schema
+    schema = pa.schema([(column, pa.string()) for column in columns])
+    rows = 0
+    with pq.ParquetWriter(out, schema, compression='snappy') as writer:
+        for chunk in chunks:
+            writer.write_table(pa.table(
+                {column: [_cell(post.get(column)) for post in chunk] for column in columns}, schema=schema
+            ))
+            rows += len(chunk)
+        if not rows:
+            writer.write_table(schema.empty_table())
+    return rows
+
+
+def write_posts(chunks: Iterable[List[Dict]], out: BinaryIO, fmt: str = 'csv',
+                columns: Optional[Sequence[str]] = None) -> int:
+    """
+    Write chunks of posts to a binary file object.
+
+    Args:
+        chunks: Lists of post dictionaries, e.g. from PostStore.iter_posts()
+        out: Binary file object to write to (left open)
+        fmt: One of EXPORT_FORMATS
+        columns: Fields to export, in order (defaults to EXPORT_COLUMNS)
+
+    Returns:
+        Number of posts written
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    columns = list(columns or EXPORT_COLUMNS)
+    if fmt == 'parquet':
+        return _write_parquet(chunks, out, columns)
+    return _write_csv(chunks, out, columns, compress=fmt == 'csv.gz')
+
+
+def export_to_bytes(chunks: Iterable[List[Dict]], fmt: str = 'csv',
+                    columns: Optional[Sequence[str]] = None) -> bytes:
+    """Write an export into memory and return its contents (e.g. for st.download_button)."""
+    with io.BytesIO() as out:
+        write_posts(chunks, out, fmt, columns)
+        return out.getvalue()
@@ -0,0 +1,229 @@
+"""
+Append-only JSONL backend for the post cache.
+
+New posts are appended to `data/posts.jsonl`, one JSON object per line, so a
+write costs O(new posts) and a crash can at most leave one truncated line,
+which is skipped on load. A background compaction rewrites the log atomically,
+dropping duplicate `post_id`s and posts past the retention window.
+"""
+import os
+import json
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, Iterator, List, Optional, Set
+from services.post_store import PostStore, empty_cache, file_signature, parse_timestamp, published_between
+
+# Compact once the log holds this many more lines than live posts
+COMPACTION_SLACK = 500
+
+
+class JsonlPostStore(PostStore):
+    """Append-only log backend (`data/posts.jsonl` + `data/posts_meta.json`)."""
+
+    def __init__(self, path: str = 'data/posts.jsonl', meta_path: str = 'data/posts_meta.json',
+                 retention_days: float = 30, legacy_json_path: Optional[str] = 'data/posts.json'):
+        self.path = path
+        self.meta_path = meta_path
+        self.retention_days = retention_days
+        self._lock = threading.RLock()
+        self._ids: Optional[Set[str]] = None
+        self._lines = 0
+        self._size = -1
+        self._compacting = False
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        if legacy_json_path and not os.path.exists(path) and os.path.exists(legacy_json_path):
+            try:
+                with open(legacy_json_path, 'r', encoding='utf-8') as f:
+                    self.save(json.load(f))
+            except (OSError, ValueError):
+                pass
+        elif os.path.exists(path):
+            # Drop duplicates and expired posts left by previous runs
+            self.compact_in_background()
+
+    # Log reading / writing
+
+    def _read_log(self) -> List[Dict]:
+        """Read every intact record, keeping the first occurrence of each post_id."""
+        posts = []
+        seen = set()
+        lines = 0
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    lines += 1
+                    try:
+                        post = json.loads(line)
+                    except ValueError:
+                        continue  # Truncated or corrupt line from an interrupted write
+                    if not isinstance(post, dict) or post.get('post_id') in seen:
+                        continue
+                    seen.add(post.get('post_id'))
+                    posts.append(post)
+        self._ids = seen
+        self._lines = lines
+        self._size = self._file_size()
+        return posts
+
+    def _file_size(self) -> int:
+        try:
+            return os.path.getsize(self.path)
+        except OSError:
+            return -1
+
+    def _ensure_ids(self) -> Set[str]:
+        # Re-read if another process has written to the log since we last looked
+        if self._ids is None or self._file_size() != self._size:
+            self._read_log()
+        return self._ids
+
+    def _write_atomic(self, path: str, content: str) -> None:
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def _encode(self, posts: List[Dict]) -> str:
+        return ''.join(json.dumps(post, ensure_ascii=False) + '\n' for post in posts)
+
+    # Metadata
+
+    def get_meta(self) -> Dict:
+        meta = empty_cache()['meta']
+        if os.path.exists(self.meta_path):
+            try:
+                with open(self.meta_path, 'r', encoding='utf-8') as f:
+                    meta.update(json.load(f))
+            except (OSError, ValueError):
+                pass
+        return meta
+
+    def _update_meta(self, updates: Dict) -> None:
+        meta = self.get_meta()
+        meta.update(updates)
+        self._write_atomic(self.meta_path, json.dumps(meta, indent=2))
+
+    # PostStore API
+
+    def signature(self) -> tuple:
+        return file_signature(self.path, self.meta_path)
+
+    def load(self) -> Dict:
+        with self._lock:
+            posts = self._read_log()
+        return {"posts": posts, "meta": self.get_meta()}
+
+    def save(self, data: Dict) -> None:
+        with self._lock:
+            self._write_atomic(self.path, self._encode(data.get('posts', [])))
+            self._ids = None
+            self._update_meta(dict(data.get('meta', {}), total_posts=len(data.get('posts', []))))
+
+    def update_meta(self, updates: Dict) -> None:
+        with self._lock:
+            self._update_meta(updates)
+
+    def known_ids(self, post_ids: Iterable[str]) -> Set[str]:
+        with self._lock:
+            return self._ensure_ids().intersection(post_ids)
+
+    def add_posts(self, posts: List[Dict], meta_updates: Dict) -> None:
+        with self._lock:
+            ids = self._ensure_ids()
+            posts = [post for post in posts if post['post_id'] not in ids]
+
+            if posts:
+                with open(self.path, 'ab+') as f:
+                    # Terminate a partial line left by an interrupted write
+                    end = f.seek(0, os.SEEK_END)
+                    if end > 0:
+                        f.seek(end - 1)
+                        if f.read(1) != b'\n':
+                            f.write(b'\n')
+                    f.write(self._encode(posts).encode('utf-8'))
+                    f.flush()
+                    os.fsync(f.fileno())
+                ids.update(post['post_id'] for post in posts)
+                self._lines += len(posts)
+                self._size = self._file_size()
+
+            self._update_meta(dict(meta_updates, total_posts=len(ids)))
+
+            if self._lines - len(ids) > COMPACTION_SLACK:
+                self.compact_in_background()
+
+    def iter_posts(self, since: Optional[datetime] = None, until: Optional[datetime] = None,
+                   chunk_size: int = 1000) -> Iterator[List[Dict]]:
+        # The open handle keeps reading the old file if a compaction replaces
+        # it, so the lock isn't held while the log is streamed
+        if not os.path.exists(self.path):
+            return
+        seen = set()
+        chunk = []
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    post = json.loads(line)
+                except ValueError:
+                    continue  # Truncated or corrupt line from an interrupted write
+                if not isinstance(post, dict) or post.get('post_id') in seen:
+                    continue
+                seen.add(post.get('post_id'))
+                if published_between(post, since, until):
+                    chunk.append(post)
+                    if len(chunk) >= chunk_size:
+                        yield chunk
+                        chunk = []
+        if chunk:
+            yield chunk
+
+    def clear(self) -> bool:
+        with self._lock:
+            had_posts = bool(self._ensure_ids())
+            # Keep an empty log so the legacy JSON file isn't imported again
+            self.save(empty_cache())
+        return had_posts
+
+    # Compaction
+
+    def compact(self) -> int:
+        """
+        Rewrite the log without duplicates or posts older than the retention window.
+
+        Returns:
+            Number of lines removed
+        """
+        cutoff = datetime.now(timezone.utc) - timedelta(days=self.retention_days)
+        with self._lock:
+            posts = self._read_log()
+            lines_before = self._lines
+            kept = []
+            for post in posts:
+                published_date = parse_timestamp(post.get('published_at'))
+                if published_date is None or published_date >= cutoff:
+                    kept.append(post)
+
+            self._write_atomic(self.path, self._encode(kept))
+            self._ids = {post['post_id'] for post in kept}
+            self._lines = len(kept)
+            self._size = self._file_size()
+            self._update_meta({'total_posts': len(kept), 'last_compacted': datetime.now().isoformat()})
+        return lines_before - len(kept)
+
+    def compact_in_background(self) -> None:
+        """Start a compaction on a daemon thread unless one is already running."""
+        with self._lock:
+            if self._compacting:
+                return
+            self._compacting = True
+
+        def run():
+            try:
+                self.compact()
+            finally:
+                self._compacting = False
+
+        threading.Thread(target=run, name='posts-jsonl-compaction', daemon=True).start()
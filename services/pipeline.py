@@ -0,0 +1,125 @@
+"""
+Concurrent fetch + summarize pipeline for processing channels.
+
+YouTube fetches and AI summarization run as two separate stages, each on its
+own thread pool, so summaries for one channel overlap fetches for the next.
+A coroutine `summarize_fn` runs on the shared background event loop instead.
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Dict, List, Optional, Tuple
+import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from services.async_runner import BoundedRunner
+
+
+def _attach_script_context(ctx) -> None:
+    """Let worker threads call st.* functions on behalf of the current session."""
+    if ctx is not None:
+        add_script_run_ctx(threading.current_thread(), ctx)
+
+
+def run_pipeline(
+    channel_ids: List[str],
+    fetch_fn: Callable[[str], List[Dict]],
+    summarize_fn: Callable[[List[Tuple[str, Dict]]], List[Optional[Dict]]],
+    fetch_workers: int = 4,
+    summarize_workers: int = 4,
+    videos_per_channel: int = 3,
+    batch_size: int = 1,
+    on_progress: Optional[Callable[[Dict], None]] = None
+) -> List[Dict]:
+    """
+    Fetch videos for every channel and summarize them concurrently.
+
+    Args:
+        channel_ids: Channels to process
+        fetch_fn: Called with a channel ID, returns that channel's videos
+        summarize_fn: Called with a batch of (channel_id, video) pairs, returns
+            one post dictionary (or None) per pair; may be an `async def`
+        fetch_workers: Maximum number of concurrent channel fetches
+        summarize_workers: Maximum number of concurrent summarize batches (or
+            in-flight coroutines for an async summarize_fn)
+        videos_per_channel: Expected videos per channel, used to estimate progress
+        batch_size: Maximum videos per summarize_fn call
+        on_progress: Called from the calling thread with a progress dictionary
+
+    Returns:
+        List of post dictionaries in channel order
+    """
+    ctx = get_script_run_ctx()
+    batch_size = max(1, batch_size)
+    runner = BoundedRunner(summarize_workers) if asyncio.iscoroutinefunction(summarize_fn) else None
+    results = {}
+    buffer = []
+    progress = {
+        'channels_done': 0,
+        'channels_total': len(channel_ids),
+        'videos_done': 0,
+        'videos_total': 0,
+        'fraction': 0.0
+    }
+
+    def report():
+        if on_progress is None:
+            return
+        remaining_channels = progress['channels_total'] - progress['channels_done']
+        expected_videos = progress['videos_total'] + remaining_channels * videos_per_channel
+        total_units = progress['channels_total'] + expected_videos
+        done_units = progress['channels_done'] + progress['videos_done']
+        progress['fraction'] = min(done_units / total_units, 1.0) if total_units else 1.0
+        on_progress(dict(progress))
+
+    with ThreadPoolExecutor(max_workers=max(1, fetch_workers), thread_name_prefix='fetch',
+                            initializer=_attach_script_context, initargs=(ctx,)) as fetch_pool, \
+         ThreadPoolExecutor(max_workers=max(1, summarize_workers), thread_name_prefix='summarize',
+                            initializer=_attach_script_context, initargs=(ctx,)) as summarize_pool:
+
+        pending = {}
+        for i, channel_id in enumerate(channel_ids):
+            pending[fetch_pool.submit(fetch_fn, channel_id)] = ('fetch', [(i, None, channel_id)])
+
+        def submit_batches(flush: bool):
+            # Summarize full batches as they fill; flush the remainder once fetching is done
+            while len(buffer) >= batch_size or (flush and buffer):
+                batch = buffer[:batch_size]
+                del buffer[:batch_size]
+                items = [(channel_id, video) for _, _, channel_id, video in batch]
+                keys = [(i, j, channel_id) for i, j, channel_id, _ in batch]
+                if runner is not None:
+                    future = runner.submit(summarize_fn, items)
+                else:
+                    future = summarize_pool.submit(summarize_fn, items)
+                pending[future] = ('summarize', keys)
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                stage, keys = pending.pop(future)
+
+                try:
+                    result = future.result()
+                except Exception as e:
+                    channels = ', '.join(dict.fromkeys(channel_id for _, _, channel_id in keys))
+                    st.warning(f"⚠️ {stage.title()} failed for {channels}: {e}")
+                    result = None
+
+                if stage == 'fetch':
+                    i, _, channel_id = keys[0]
+                    progress['channels_done'] += 1
+                    for j, video in enumerate(result or []):
+                        progress['videos_total'] += 1
+                        buffer.append((i, j, channel_id, video))
+                else:
+                    progress['videos_done'] += len(keys)
+                    for (i, j, _), post in zip(keys, result or []):
+                        if post is not None:
+                            results[(i, j)] = post
+
+            fetching = any(stage == 'fetch' for stage, _ in pending.values())
+            submit_batches(flush=not fetching)
+            report()
+
+    return [results[key] for key in sorted(results)]
@@ -0,0 +1,369 @@
+"""
+Compact, column-oriented in-memory copy of the cached posts.
+
+The shared cache snapshot holds its posts as a `ColumnarPosts` instead of a
+list of dictionaries: channel ids, channel titles and sentiments are
+interned into small integer codes, publish times are epoch seconds, trend
+ids live in one CSR-style array, and the long text fields (title, summary,
+URL, trends) are packed into one UTF-8 buffer per field that is only
+decoded when a post is read. Indexing returns `PostView`s, read-only
+mappings that behave like the original post dictionaries.
+"""
+from collections.abc import Mapping, Sequence as SequenceABC
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+import numpy as np
+import pandas as pd
+from services.post_store import parse_timestamp
+
+# Low-cardinality fields stored as codes into a table of distinct values
+INTERNED_FIELDS = ('platform', 'channel_id', 'channel_title', 'sentiment')
+
+# Long text fields packed into one buffer each
+TEXT_FIELDS = ('post_id', 'title', 'url', 'summary', 'trends', 'cached_at')
+
+# Key order of the dictionaries built in app.process_channels
+_FIELD_ORDER = ('platform', 'channel_id', 'post_id', 'title', 'url', 'published_at', 'summary', 'sentiment',
+                'trends', 'cached_at', 'channel_title', 'trend_ids')
+
+_TIMESTAMP_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
+# Codes / states for fields a post doesn't have
+_MISSING = -1
+_UNDATED = np.iinfo(np.int64).min
+
+
+class _Absent:
+    def __repr__(self) -> str:
+        return '<absent>'
+
+
+# Marks a field the post doesn't have (None is a real value)
+_ABSENT = _Absent()
+
+
+class _InternedColumn:
+    """Integer codes into a list of distinct values."""
+
+    def __init__(self, values: List):
+        table = {}
+        codes = np.full(len(values), _MISSING, dtype=np.int32)
+        for row, value in enumerate(values):
+            if value is not _ABSENT:
+                codes[row] = table.setdefault(value, len(table))
+        self.codes = codes
+        self.values = list(table)
+
+    def has(self, row: int) -> bool:
+        return self.codes[row] != _MISSING
+
+    def get(self, row: int):
+        code = self.codes[row]
+        return _ABSENT if code == _MISSING else self.values[code]
+
+    def categorical(self, rows: Optional[np.ndarray] = None) -> pd.Categorical:
+        """The column (or some rows of it) as a pandas Categorical (missing values and None become NaN)."""
+        keep = np.array([value is not None for value in self.values] + [False])
+        remap = np.where(keep, np.cumsum(keep) - 1, _MISSING)
+        categories = pd.Index([value for value in self.values if value is not None], dtype=object)
+        codes = self.codes if rows is None else self.codes[rows]
+        # Code -1 indexes the trailing False, so missing stays missing
+        return pd.Categorical.from_codes(remap[codes], categories=categories)
+
+    def matching(self, values: Iterable) -> np.ndarray:
+        """Boolean mask of rows whose value is one of `values`."""
+        wanted = set(values)
+        codes = [code for code, value in enumerate(self.values) if value in wanted]
+        return np.isin(self.codes, codes)
+
+    def sort_keys(self) -> np.ndarray:
+        """Rank of each row's value in sorted order (len(values) for missing values and None)."""
+        order = sorted((code for code, value in enumerate(self.values) if value is not None),
+                       key=lambda code: str(self.values[code]))
+        ranks = np.full(len(self.values) + 1, len(self.values), dtype=np.int64)
+        ranks[order] = np.arange(len(order))
+        return ranks[self.codes]
+
+
+class _TextColumn:
+    """UTF-8 strings packed into one buffer; other values (None, lists) are kept aside."""
+
+    def __init__(self, values: List):
+        offsets = np.zeros(len(values) + 1, dtype=np.int64)
+        present = np.zeros(len(values), dtype=bool)
+        self.other: Dict[int, object] = {}
+        parts = []
+        position = 0
+        for row, value in enumerate(values):
+            if isinstance(value, str):
+                encoded = value.encode('utf-8')
+                parts.append(encoded)
+                position += len(encoded)
+                present[row] = True
+            elif value is not _ABSENT:
+                self.other[row] = value
+            offsets[row + 1] = position
+        self.buffer = b''.join(parts)
+        self.offsets = offsets
+        self.present = present
+
+    def has(self, row: int) -> bool:
+        return bool(self.present[row]) or row in self.other
+
+    def get(self, row: int):
+        if self.present[row]:
+            return self.buffer[self.offsets[row]:self.offsets[row + 1]].decode('utf-8')
+        return self.other.get(row, _ABSENT)
+
+
+class ColumnarPosts(SequenceABC):
+    """Read-only sequence of posts stored column by column."""
+
+    def __init__(self, posts: Iterable[Dict], trend_labels: Optional[Sequence[str]] = None):
+        posts = posts if isinstance(posts, list) else list(posts)
+        self._size = len(posts)
+        # Trend dictionary the posts' trend_ids refer to (needed for trend filters)
+        self.trend_labels: List[str] = list(trend_labels or [])
+
+        self._interned = {
+            field: _InternedColumn([post.get(field, _ABSENT) for post in posts]) for field in INTERNED_FIELDS
+        }
+        self._text = {field: _TextColumn([post.get(field, _ABSENT) for post in posts]) for field in TEXT_FIELDS}
+
+        # Publish times as epoch seconds; values that wouldn't format back
+        # to the same string are kept verbatim
+        self.published = np.full(self._size, _UNDATED, dtype=np.int64)
+        self._published_raw: Dict[int, object] = {}
+        for row, post in enumerate(posts):
+            value = post.get('published_at', _ABSENT)
+            parsed = parse_timestamp(value) if isinstance(value, str) else None
+            if parsed is not None:
+                self.published[row] = int(parsed.timestamp())
+                if parsed.microsecond or parsed.strftime(_TIMESTAMP_FORMAT) != value:
+                    self._published_raw[row] = value
+            else:
+                self._published_raw[row] = value
+
+        # Trend ids in CSR form: ids of row i are trend_ids[offsets[i]:offsets[i + 1]]
+        lengths = np.fromiter((len(post.get('trend_ids') or ()) for post in posts), dtype=np.int64,
+                              count=self._size)
+        self.trend_offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+        self.trend_ids = np.fromiter((trend_id for post in posts for trend_id in post.get('trend_ids') or ()),
+                                     dtype=np.int32, count=int(self.trend_offsets[-1]))
+        self._has_trend_ids = np.fromiter(('trend_ids' in post for post in posts), dtype=bool, count=self._size)
+
+        # Anything else a post carries
+        known = set(INTERNED_FIELDS) | set(TEXT_FIELDS) | {'published_at', 'trend_ids'}
+        self._extra: Dict[int, Dict] = {}
+        for row, post in enumerate(posts):
+            extra = {key: value for key, value in post.items() if key not in known}
+            if extra:
+                self._extra[row] = extra
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [PostView(self, i) for i in range(*row.indices(self._size))]
+        if row < 0:
+            row += self._size
+        if not 0 <= row < self._size:
+            raise IndexError('post index out of range')
+        return PostView(self, row)
+
+    def __iter__(self) -> Iterator['PostView']:
+        return (PostView(self, row) for row in range(self._size))
+
+    def _value(self, row: int, key: str):
+        if key in self._interned:
+            return self._interned[key].get(row)
+        if key in self._text:
+            return self._text[key].get(row)
+        if key == 'published_at':
+            if row in self._published_raw:
+                return self._published_raw[row]
+            return datetime.fromtimestamp(int(self.published[row]), timezone.utc).strftime(_TIMESTAMP_FORMAT)
+        if key == 'trend_ids':
+            if not self._has_trend_ids[row]:
+                return _ABSENT
+            return self.trend_ids[self.trend_offsets[row]:self.trend_offsets[row + 1]].tolist()
+        return self._extra.get(row, {}).get(key, _ABSENT)
+
+    def _has(self, row: int, key: str) -> bool:
+        """Whether a post has a field, without decoding it."""
+        if key in self._interned:
+            return self._interned[key].has(row)
+        if key in self._text:
+            return self._text[key].has(row)
+        if key == 'published_at':
+            return self.published[row] != _UNDATED or self._published_raw.get(row, _ABSENT) is not _ABSENT
+        if key == 'trend_ids':
+            return bool(self._has_trend_ids[row])
+        return key in self._extra.get(row, {})
+
+    def _keys(self, row: int) -> List[str]:
+        keys = [field for field in _FIELD_ORDER if self._has(row, field)]
+        keys.extend(self._extra.get(row, {}))
+        return keys
+
+    def timestamps(self) -> np.ndarray:
+        """Publish times as float epoch seconds (NaN for posts without a parseable date)."""
+        times = np.where(self.published == _UNDATED, np.nan, self.published.astype(np.float64))
+        # Verbatim values may carry sub-second precision
+        for row, value in self._published_raw.items():
+            parsed = parse_timestamp(value) if isinstance(value, str) else None
+            if parsed is not None:
+                times[row] = parsed.timestamp()
+        return times
+
+    def trend_events(self) -> Tuple[np.ndarray, np.ndarray]:
+        """(publish time, trend id) arrays for every stored trend id of a dated post."""
+        times = np.repeat(self.published, np.diff(self.trend_offsets))
+        dated = times != _UNDATED
+        return times[dated], self.trend_ids[dated].astype(np.int64)
+
+    def without_trend_ids(self) -> List['PostView']:
+        """Posts that have no stored `trend_ids`."""
+        return [PostView(self, row) for row in np.flatnonzero(~self._has_trend_ids).tolist()]
+
+    def to_dicts(self) -> List[Dict]:
+        """Plain post dictionaries, e.g. for writing back to a backend."""
+        return [view.to_dict() for view in self]
+
+    def to_frame(self, columns: Optional[Iterable[str]] = None, rows: Optional[np.ndarray] = None) -> pd.DataFrame:
+        """
+        DataFrame of the posts, built from the columns without materializing dictionaries.
+
+        Interned fields become categoricals; other missing values are None.
+
+        Args:
+            columns: Fields to include (defaults to every field some post has)
+            rows: Only these rows, in this order (e.g. one page from select())
+        """
+        rows = np.arange(self._size) if rows is None else np.asarray(rows, dtype=np.int64)
+        if columns is None:
+            columns = list(dict.fromkeys(key for row in rows.tolist() for key in self._keys(row)))
+        frame = {}
+        for field in columns:
+            if field in self._interned:
+                frame[field] = self._interned[field].categorical(rows)
+            else:
+                frame[field] = [None if value is _ABSENT else value
+                                for value in (self._value(row, field) for row in rows.tolist())]
+        return pd.DataFrame(frame, columns=list(columns), index=rows)
+
+    def distinct(self, field: str) -> List:
+        """Distinct non-null values of an interned field, sorted."""
+        return sorted(value for value in self._interned[field].values if value is not None)
+
+    def value_counts(self, field: str) -> pd.Series:
+        """Counts of each value of an interned field, most common first."""
+        column = self._interned[field]
+        counts = np.bincount(column.codes[column.codes != _MISSING], minlength=len(column.values))
+        series = pd.Series(counts, index=pd.Index(column.values, dtype=object), dtype='int64')
+        return series[series.index.notna() & (series > 0)].sort_values(ascending=False, kind='stable')
+
+    def trend_rows(self, trend: str) -> np.ndarray:
+        """Boolean mask of rows whose stored trend ids include `trend` (a label from trend_labels)."""
+        mask = np.zeros(self._size, dtype=bool)
+        if trend not in self.trend_labels:
+            return mask
+        hits = self.trend_ids == self.trend_labels.index(trend)
+        mask[np.repeat(np.arange(self._size), np.diff(self.trend_offsets))[hits]] = True
+        return mask
+
+    def select(self, channel_titles: Optional[Iterable[str]] = None, sentiments: Optional[Iterable[str]] = None,
+               trend: Optional[str] = None, since: Optional[datetime] = None, until: Optional[datetime] = None,
+               sort_by: str = 'published_at', descending: bool = True) -> np.ndarray:
+        """
+        Rows matching every given filter, sorted; only text sort keys are decoded.
+
+        Args:
+            channel_titles: Keep posts from these channels
+            sentiments: Keep posts with these sentiments
+            trend: Keep posts tagged with this trend (a label from trend_labels)
+            since: Keep posts published at or after this time
+            until: Keep posts published at or before this time
+            sort_by: Field to sort on (ties keep cache order)
+            descending: Sort largest / newest first
+
+        Returns:
+            Array of row numbers, for to_frame(rows=...)
+        """
+        mask = np.ones(self._size, dtype=bool)
+        if channel_titles:
+            mask &= self._interned['channel_title'].matching(channel_titles)
+        if sentiments:
+            mask &= self._interned['sentiment'].matching(sentiments)
+        if trend:
+            mask &= self.trend_rows(trend)
+        if since is not None or until is not None:
+            times = self.timestamps()
+            mask &= ~np.isnan(times)
+            if since is not None:
+                mask &= times >= since.timestamp()
+            if until is not None:
+                mask &= times <= until.timestamp()
+        rows = np.flatnonzero(mask)
+
+        if sort_by == 'published_at':
+            keys = self.timestamps()[rows]
+            missing = np.isnan(keys)
+            keys = np.where(missing, 0.0, keys)
+        elif sort_by in self._interned:
+            keys = self._interned[sort_by].sort_keys()[rows]
+            missing = keys == len(self._interned[sort_by].values)
+        else:
+            values = [self._value(row, sort_by) for row in rows.tolist()]
+            missing = np.array([value is _ABSENT or value is None for value in values], dtype=bool)
+            keys = np.array(['' if miss else str(value) for value, miss in zip(values, missing)], dtype=object)
+        if descending:
+            keys = _descending_ranks(keys)
+        # Missing values last either way; np.lexsort is stable, so ties keep cache order
+        return rows[np.lexsort((keys, missing))] if len(rows) else rows
+
+    def memory_bytes(self) -> int:
+        """Approximate size of the column data (excluding small lookup tables)."""
+        total = self.published.nbytes + self.trend_offsets.nbytes + self.trend_ids.nbytes
+        total += sum(column.codes.nbytes for column in self._interned.values())
+        total += sum(len(column.buffer) + column.offsets.nbytes + column.present.nbytes
+                     for column in self._text.values())
+        return total
+
+
+def _descending_ranks(keys: np.ndarray) -> np.ndarray:
+    """Sort keys whose ascending order is the descending order of `keys` (ties kept equal)."""
+    _, inverse = np.unique(keys, return_inverse=True)
+    return -inverse.reshape(-1)
+
+
+class PostView(Mapping):
+    """One post of a ColumnarPosts, read like a dictionary."""
+
+    __slots__ = ('_posts', '_row')
+
+    def __init__(self, posts: ColumnarPosts, row: int):
+        self._posts = posts
+        self._row = row
+
+    def __getitem__(self, key: str):
+        value = self._posts._value(self._row, key)
+        if value is _ABSENT:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key) -> bool:
+        return self._posts._has(self._row, key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._posts._keys(self._row))
+
+    def __len__(self) -> int:
+        return len(self._posts._keys(self._row))
+
+    def __repr__(self) -> str:
+        return f"PostView({self.to_dict()!r})"
+
+    def to_dict(self) -> Dict:
+        return {key: self[key] for key in self}
@@ -0,0 +1,137 @@
+"""
+In-memory time index over cached posts.
+
+Posts are sorted once by parsed `published_at`, so window queries are a
+bisect plus a slice instead of parsing every timestamp on every call.
+"""
+import re
+import heapq
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta, timezone
+from operator import itemgetter
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+import numpy as np
+from services.post_store import parse_timestamp
+from services.post_columns import ColumnarPosts
+
+_WINDOW_PATTERN = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*([mhdw]?)\s*$', re.IGNORECASE)
+_WINDOW_UNITS = {'m': 'minutes', 'h': 'hours', '': 'hours', 'd': 'days', 'w': 'weeks'}
+
+
+def parse_window(window: Union[int, float, str, timedelta]) -> timedelta:
+    """
+    Convert a window such as 48, "6h", "24h", "7d" or "30m" into a timedelta.
+
+    Bare numbers are hours.
+    """
+    if isinstance(window, timedelta):
+        return window
+    if isinstance(window, (int, float)):
+        return timedelta(hours=window)
+
+    match = _WINDOW_PATTERN.match(str(window))
+    if not match:
+        raise ValueError(f"Invalid time window: {window!r} (use e.g. '6h', '24h' or '7d')")
+    amount, unit = match.groups()
+    return timedelta(**{_WINDOW_UNITS[unit.lower()]: float(amount)})
+
+
+class PostTimeIndex:
+    """Posts sorted by publish time, with optional per-channel sub-indexes."""
+
+    def __init__(self, posts: List[Dict]):
+        self._channels: Optional[Dict[str, Tuple[List[float], List[Dict], List[Dict]]]] = None
+        if isinstance(posts, ColumnarPosts):
+            self._index_columns(posts)
+            return
+
+        dated = []
+        self.undated: List[Dict] = []
+        for post in posts:
+            published = parse_timestamp(post.get('published_at'))
+            if published is None:
+                self.undated.append(post)
+            else:
+                dated.append((published.timestamp(), post))
+
+        dated.sort(key=lambda item: item[0])
+        self.times = [timestamp for timestamp, _ in dated]
+        self.posts = [post for _, post in dated]
+
+    def _index_columns(self, posts: ColumnarPosts) -> None:
+        """Sort by the stored epoch times instead of parsing each timestamp."""
+        times = posts.timestamps()
+        undated = np.isnan(times)
+        rows = np.flatnonzero(~undated)
+        rows = rows[np.argsort(times[rows], kind='stable')]
+        self.times = times[rows].tolist()
+        self.posts = [posts[row] for row in rows.tolist()]
+        self.undated = [posts[row] for row in np.flatnonzero(undated).tolist()]
+
+    def __len__(self) -> int:
+        return len(self.posts) + len(self.undated)
+
+    def _channel_index(self) -> Dict[str, Tuple[List[float], List[Dict], List[Dict]]]:
+        if self._channels is None:
+            channels = {}
+            for timestamp, post in zip(self.times, self.posts):
+                times, posts, _ = channels.setdefault(post.get('channel_id'), ([], [], []))
+                times.append(timestamp)
+                posts.append(post)
+            for post in self.undated:
+                channels.setdefault(post.get('channel_id'), ([], [], []))[2].append(post)
+            self._channels = channels
+        return self._channels
+
+    def latest_per_channel(self) -> Dict[str, Dict]:
+        """Newest dated post for each channel."""
+        return {cid: posts[-1] for cid, (_, posts, _) in self._channel_index().items() if posts}
+
+    def window(
+        self,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        channel_ids: Optional[Union[str, Iterable[str]]] = None,
+        include_undated: bool = True
+    ) -> List[Dict]:
+        """
+        Posts published in [since, until], oldest first.
+
+        Args:
+            since: Start of the window (None for no lower bound)
+            until: End of the window (None for no upper bound)
+            channel_ids: Restrict to one channel ID or a collection of them
+            include_undated: Also return posts whose publish date can't be parsed
+
+        Returns:
+            List of post dictionaries
+        """
+        if channel_ids is None:
+            sources = [(self.times, self.posts, self.undated)]
+        else:
+            if isinstance(channel_ids, str):
+                channel_ids = [channel_ids]
+            channel_index = self._channel_index()
+            sources = [channel_index[cid] for cid in dict.fromkeys(channel_ids) if cid in channel_index]
+
+        slices = []
+        undated_posts = []
+        for times, posts, undated in sources:
+            start = bisect_left(times, since.timestamp()) if since is not None else 0
+            end = bisect_right(times, until.timestamp()) if until is not None else len(times)
+            slices.append((times[start:end], posts[start:end]))
+            if include_undated:
+                undated_posts.extend(undated)
+
+        if len(slices) == 1:
+            results = slices[0][1]
+        else:
+            merged = heapq.merge(*(zip(times, posts) for times, posts in slices), key=itemgetter(0))
+            results = [post for _, post in merged]
+        return results + undated_posts
+
+    def recent(self, window: Union[int, float, str, timedelta] = 48,
+               channel_ids: Optional[Union[str, Iterable[str]]] = None) -> List[Dict]:
+        """Posts published within `window` of now (e.g. 48, "6h", "7d")."""
+        since = datetime.now(timezone.utc) - parse_window(window)
+        return self.window(since=since, channel_ids=channel_ids)
@@ -0,0 +1,183 @@
+"""
+Storage backends for the post cache.
+
+`services.cache_store` exposes the public cache API and delegates to one of
+these backends. `JsonPostStore` keeps the original single-file format.
+"""
+import os
+import json
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+import streamlit as st
+
+
+def empty_cache() -> Dict:
+    """Default cache structure."""
+    return {
+        "posts": [],
+        "meta": {
+            "last_run": None,
+            "total_posts": 0,
+            "last_updated": None
+        }
+    }
+
+
+def parse_timestamp(value: str) -> Optional[datetime]:
+    """Parse an ISO timestamp into an aware UTC datetime (naive values are taken as UTC)."""
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except (AttributeError, TypeError, ValueError):
+        return None
+    if parsed.tzinfo is None:
+        return parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+
+def file_signature(*paths: str) -> tuple:
+    """(mtime, size) of each path, used to notice writes from other processes."""
+    signature = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            signature.append((stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            signature.append(None)
+    return tuple(signature)
+
+
+def published_between(post: Dict, since: Optional[datetime], until: Optional[datetime]) -> bool:
+    """
+    Whether a post was published in [since, until].
+
+    With no bounds every post matches; otherwise posts with unparseable
+    dates are left out.
+    """
+    if since is None and until is None:
+        return True
+    published = parse_timestamp(post.get('published_at'))
+    if published is None:
+        return False
+    return (since is None or published >= since) and (until is None or published <= until)
+
+
+class PostStore:
+    """Interface implemented by post cache backends."""
+
+    def signature(self) -> tuple:
+        """Cheap fingerprint of the stored data that changes whenever it is written."""
+        raise NotImplementedError
+
+    def load(self) -> Dict:
+        """Return the whole cache as {"posts": [...], "meta": {...}}."""
+        raise NotImplementedError
+
+    def save(self, data: Dict) -> None:
+        """Replace the whole cache with `data`."""
+        raise NotImplementedError
+
+    def get_meta(self) -> Dict:
+        """Return cache metadata without loading posts."""
+        raise NotImplementedError
+
+    def update_meta(self, updates: Dict) -> None:
+        """Merge `updates` into the metadata."""
+        raise NotImplementedError
+
+    def known_ids(self, post_ids: Iterable[str]) -> Set[str]:
+        """Return the subset of `post_ids` already stored."""
+        raise NotImplementedError
+
+    def add_posts(self, posts: List[Dict], meta_updates: Dict) -> None:
+        """Store new posts and merge `meta_updates` into the metadata."""
+        raise NotImplementedError
+
+    def iter_posts(self, since: Optional[datetime] = None, until: Optional[datetime] = None,
+                   chunk_size: int = 1000) -> Iterator[List[Dict]]:
+        """
+        Yield stored posts in lists of at most `chunk_size`.
+
+        Backends that can read their storage incrementally override this so
+        exports don't hold the whole cache in memory; the default loads it.
+
+        Args:
+            since: Only posts published at or after this time
+            until: Only posts published at or before this time
+            chunk_size: Maximum posts per chunk
+        """
+        posts = [post for post in self.load()['posts'] if published_between(post, since, until)]
+        for start in range(0, len(posts), chunk_size):
+            yield posts[start:start + chunk_size]
+
+    def published_range(self) -> Tuple[int, Optional[datetime], Optional[datetime]]:
+        """
+        Number of stored posts and the earliest and latest publish times.
+
+        The default streams iter_posts(); times are None when no post has a
+        parseable date.
+        """
+        count = 0
+        first = last = None
+        for chunk in self.iter_posts():
+            count += len(chunk)
+            for post in chunk:
+                published = parse_timestamp(post.get('published_at'))
+                if published is not None:
+                    first = published if first is None else min(first, published)
+                    last = published if last is None else max(last, published)
+        return count, first, last
+
+    def clear(self) -> bool:
+        """Delete all cached data. Returns False if there was nothing to clear."""
+        raise NotImplementedError
+
+
+class JsonPostStore(PostStore):
+    """Whole-file JSON backend (`data/posts.json`)."""
+
+    def __init__(self, path: str = 'data/posts.json'):
+        self.path = path
+
+    def signature(self) -> tuple:
+        return file_signature(self.path)
+
+    def load(self) -> Dict:
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            except Exception as e:
+                st.warning(f"⚠️ Error loading cache: {e}")
+
+        # Return default structure if file doesn't exist or is corrupted
+        return empty_cache()
+
+    def save(self, data: Dict) -> None:
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+
+    def get_meta(self) -> Dict:
+        return self.load()['meta']
+
+    def update_meta(self, updates: Dict) -> None:
+        data = self.load()
+        data['meta'].update(updates)
+        self.save(data)
+
+    def known_ids(self, post_ids: Iterable[str]) -> Set[str]:
+        existing_ids = {post['post_id'] for post in self.load()['posts']}
+        return existing_ids.intersection(post_ids)
+
+    def add_posts(self, posts: List[Dict], meta_updates: Dict) -> None:
+        data = self.load()
+        data['posts'].extend(posts)
+        data['meta'].update(meta_updates)
+        data['meta']['total_posts'] = len(data['posts'])
+        self.save(data)
+
+    def clear(self) -> bool:
+        if os.path.exists(self.path):
+            os.remove(self.path)
+            return True
+        return False
@@ -0,0 +1,227 @@
+"""
+Shared token-bucket rate limiting for AI provider calls.
+
+Each provider gets one limiter per process with independent requests-per-minute
+and tokens-per-minute budgets. Limiters are safe to share between threads and
+asyncio tasks, and slow down adaptively when the provider answers with a 429.
+"""
+import os
+import re
+import asyncio
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+
+
+# Default budgets per provider, overridable with e.g. GEMINI_RPM / OPENAI_TPM
+DEFAULT_LIMITS = {
+    'gemini': {'rpm': 15, 'tpm': 1_000_000},
+    'openai': {'rpm': 500, 'tpm': 200_000},
+}
+
+# Adaptive backoff: halve throughput on a 429, recover slowly on success
+BACKOFF_FACTOR = 0.5
+RECOVERY_STEP = 0.05
+MIN_SCALE = 0.1
+
+# "Please retry in 27.5s" in Gemini's 429 message
+_RETRY_IN_RE = re.compile(r'retry (?:in|after) (\d+(?:\.\d+)?)\s*(ms|s)(?:ec(?:onds?)?)?\b', re.IGNORECASE)
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at `rate_per_minute`.
+
+    Callers reserve tokens up front and are told how long to wait, so waiting
+    happens outside the lock and concurrent callers are served in order.
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate_per_minute = float(rate_per_minute)
+        self.capacity = float(capacity if capacity is not None else rate_per_minute)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float, scale: float) -> None:
+        elapsed = now - self._updated
+        self._updated = now
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate_per_minute * scale / 60.0)
+
+    def reserve(self, amount: float, now: float, scale: float = 1.0) -> float:
+        """Take `amount` tokens and return the seconds to wait before using them."""
+        self._refill(now, scale)
+        self._tokens -= amount
+        if self._tokens >= 0:
+            return 0.0
+        return -self._tokens * 60.0 / (self.rate_per_minute * scale)
+
+    def refund(self, amount: float) -> None:
+        """Give back tokens that were reserved but not used (negative to charge more)."""
+        self._tokens = min(self.capacity, self._tokens + amount)
+
+
+class ProviderRateLimiter:
+    """Requests-per-minute and tokens-per-minute limits for one provider."""
+
+    def __init__(self, provider: str, rpm: float, tpm: float):
+        self.provider = provider
+        self._lock = threading.Lock()
+        self._requests = TokenBucket(rpm)
+        self._tokens = TokenBucket(tpm)
+        self._scale = 1.0
+        self._blocked_until = 0.0
+
+    def configure(self, rpm: Optional[float] = None, tpm: Optional[float] = None) -> None:
+        """Change the budgets (a changed bucket starts full)."""
+        with self._lock:
+            if rpm and rpm != self._requests.rate_per_minute:
+                self._requests = TokenBucket(rpm)
+            if tpm and tpm != self._tokens.rate_per_minute:
+                self._tokens = TokenBucket(tpm)
+
+    def _reserve(self, tokens: int) -> float:
+        with self._lock:
+            now = time.monotonic()
+            wait = max(
+                self._requests.reserve(1, now, self._scale),
+                self._tokens.reserve(tokens, now, self._scale),
+                self._blocked_until - now
+            )
+        return max(wait, 0.0)
+
+    def acquire(self, tokens: int = 0) -> None:
+        """Block the calling thread until a request of `tokens` may be sent."""
+        wait = self._reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self, tokens: int = 0) -> None:
+        """Wait without blocking the event loop until a request may be sent."""
+        wait = self._reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def refund(self, tokens: int = 0) -> None:
+        """Give back the request and tokens reserved for a call the provider rejected."""
+        with self._lock:
+            self._requests.refund(1)
+            self._tokens.refund(tokens)
+
+    def settle(self, estimated_tokens: int, actual_tokens: int) -> None:
+        """Correct the token budget once the real usage of a request is known."""
+        with self._lock:
+            self._tokens.refund(estimated_tokens - actual_tokens)
+
+    def report_success(self) -> None:
+        """Recover throughput gradually after a successful call."""
+        with self._lock:
+            self._scale = min(1.0, self._scale + RECOVERY_STEP)
+
+    def report_rate_limited(self, retry_after: Optional[float] = None) -> None:
+        """Back off after a 429 response from the provider."""
+        with self._lock:
+            self._scale = max(MIN_SCALE, self._scale * BACKOFF_FACTOR)
+            pause = retry_after if retry_after else 60.0 / max(self._requests.rate_per_minute * self._scale, 1e-6)
+            self._blocked_until = max(self._blocked_until, time.monotonic() + pause)
+
+    def stats(self) -> Dict:
+        """Current limits and backoff state."""
+        with self._lock:
+            return {
+                'rpm': self._requests.rate_per_minute,
+                'tpm': self._tokens.rate_per_minute,
+                'scale': round(self._scale, 2)
+            }
+
+
+_limiters: Dict[str, ProviderRateLimiter] = {}
+_registry_lock = threading.Lock()
+
+
+def get_default_limits(provider: str) -> Dict[str, float]:
+    """Configured budgets for a provider, with environment overrides applied."""
+    defaults = DEFAULT_LIMITS.get(provider, {'rpm': 60, 'tpm': 100_000})
+    return {
+        'rpm': float(os.getenv(f'{provider.upper()}_RPM', defaults['rpm'])),
+        'tpm': float(os.getenv(f'{provider.upper()}_TPM', defaults['tpm']))
+    }
+
+
+def get_rate_limiter(provider: str) -> ProviderRateLimiter:
+    """Return the process-wide limiter for a provider, creating it on first use."""
+    with _registry_lock:
+        limiter = _limiters.get(provider)
+        if limiter is None:
+            limits = get_default_limits(provider)
+            limiter = ProviderRateLimiter(provider, limits['rpm'], limits['tpm'])
+            _limiters[provider] = limiter
+        return limiter
+
+
+def configure_rate_limits(provider: str, rpm: Optional[float] = None, tpm: Optional[float] = None) -> None:
+    """Update the budgets for a provider."""
+    get_rate_limiter(provider).configure(rpm, tpm)
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """Check whether an exception from a provider SDK is a 429 response."""
+    for attr in ('code', 'status_code'):
+        try:
+            if int(getattr(error, attr, 0) or 0) == 429:
+                return True
+        except (TypeError, ValueError):
+            pass
+    return '429' in str(error) or 'rate limit' in str(error).lower()
+
+
+def _parse_seconds(value) -> Optional[float]:
+    """Seconds from a Retry-After value: a number, "27s" or an HTTP date."""
+    value = str(value).strip()
+    try:
+        return max(float(value.rstrip('s')), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max((parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """
+    How long a provider asked to wait after a 429, if it said.
+
+    Reads the Retry-After headers of the HTTP response (OpenAI), the
+    RetryInfo error detail (Gemini), or a "retry in 27s" hint in the message.
+    """
+    headers = getattr(getattr(error, 'response', None), 'headers', None) or {}
+    if headers.get('retry-after-ms'):
+        seconds = _parse_seconds(headers['retry-after-ms'])
+        if seconds is not None:
+            return seconds / 1000.0
+    if headers.get('retry-after'):
+        seconds = _parse_seconds(headers['retry-after'])
+        if seconds is not None:
+            return seconds
+
+    for detail in getattr(error, 'details', None) or ():
+        if isinstance(detail, dict):
+            delay = detail.get('retryDelay') or detail.get('retry_delay')
+            seconds = _parse_seconds(delay) if delay else None
+        else:
+            delay = getattr(detail, 'retry_delay', None)
+            seconds = delay.seconds + delay.nanos / 1e9 if delay is not None else None
+        if seconds is not None:
+            return seconds
+
+    match = _RETRY_IN_RE.search(str(error))
+    if match:
+        return float(match.group(1)) / (1000.0 if match.group(2).lower() == 'ms' else 1.0)
+    return None
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for budgeting (about four characters per token)."""
+    return max(1, len(text) // 4)
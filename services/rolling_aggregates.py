@@ -0,0 +1,151 @@
+"""
+Hourly rolling aggregates of trends and sentiment.
+
+Post counts, sentiment counts and trend counts are kept per hour of
+`published_at`, so window summaries (the 48h brief, Quick Stats) add up a
+few dozen buckets instead of rescanning posts. Buckets are updated as posts
+are ingested and dropped once they fall out of the retention window.
+"""
+import math
+import threading
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+from services.post_index import parse_window
+from services.post_store import parse_timestamp
+from services.trend_vocab import TrendVocabulary, normalize_trend, split_trends
+
+SENTIMENTS = ('positive', 'neutral', 'negative')
+
+BUCKET_SECONDS = 3600
+
+
+def _sentiment_of(post: Dict) -> str:
+    sentiment = (post.get('sentiment') or 'neutral').lower()
+    return sentiment if sentiment in SENTIMENTS else 'neutral'
+
+
+class _Bucket:
+    __slots__ = ('posts', 'sentiment', 'trends')
+
+    def __init__(self):
+        self.posts = 0
+        self.sentiment = Counter()
+        self.trends = Counter()
+
+    def add(self, post: Dict, trends: List[str]) -> None:
+        self.posts += 1
+        self.sentiment[_sentiment_of(post)] += 1
+        self.trends.update(trends)
+
+
+class RollingAggregates:
+    """Per-hour post, sentiment and trend counts for the most recent `retention` window."""
+
+    def __init__(self, retention: Union[int, float, str, timedelta] = 48):
+        self.retention = parse_window(retention)
+        self._lock = threading.Lock()
+        self._buckets: Dict[int, _Bucket] = {}
+        # Posts with unparseable dates count in every window, as in get_recent_posts
+        self._undated = _Bucket()
+
+    @classmethod
+    def from_posts(cls, posts: Iterable[Dict], vocabulary: Optional[TrendVocabulary] = None,
+                   retention: Union[int, float, str, timedelta] = 48) -> 'RollingAggregates':
+        aggregates = cls(retention)
+        aggregates.add_posts(posts, vocabulary)
+        return aggregates
+
+    def _oldest_bucket(self, now: datetime) -> int:
+        return math.floor((now - self.retention).timestamp() / BUCKET_SECONDS)
+
+    def add_posts(self, posts: Iterable[Dict], vocabulary: Optional[TrendVocabulary] = None) -> None:
+        """Fold new posts into their hourly buckets (posts older than the retention are ignored)."""
+        oldest = self._oldest_bucket(datetime.now(timezone.utc))
+        with self._lock:
+            for post in posts:
+                published = parse_timestamp(post.get('published_at'))
+                if published is None:
+                    bucket = self._undated
+                else:
+                    hour = math.floor(published.timestamp() / BUCKET_SECONDS)
+                    if hour < oldest:
+                        continue
+                    bucket = self._buckets.get(hour)
+                    if bucket is None:
+                        bucket = self._buckets[hour] = _Bucket()
+                bucket.add(post, _post_trends(post, vocabulary))
+
+    def expire(self, now: Optional[datetime] = None) -> int:
+        """Drop buckets that have left the retention window; returns how many were dropped."""
+        oldest = self._oldest_bucket(now or datetime.now(timezone.utc))
+        with self._lock:
+            expired = [hour for hour in self._buckets if hour < oldest]
+            for hour in expired:
+                del self._buckets[hour]
+        return len(expired)
+
+    def window(self, window: Union[int, float, str, timedelta] = 48,
+               boundary_posts: Optional[Sequence[Dict]] = None,
+               vocabulary: Optional[TrendVocabulary] = None,
+               now: Optional[datetime] = None) -> Dict:
+        """
+        Totals for posts published within `window` of now.
+
+        Whole hours are read from the buckets. The hour the window starts in is
+        only partly inside it, so its posts must be passed as `boundary_posts`
+        (see boundary()) to keep the totals exact.
+
+        Args:
+            window: Window size, e.g. 48, "24h" or "2d" (at most the retention)
+            boundary_posts: Posts published between the window start and the end of its hour
+            vocabulary: Trend dictionary for decoding boundary posts' trend_ids
+            now: Current time (defaults to now)
+
+        Returns:
+            Dictionary with post_count, sentiment_mix and trend_counts (a Counter)
+        """
+        now = now or datetime.now(timezone.utc)
+        span = parse_window(window)
+        if span > self.retention:
+            raise ValueError(f"Window {window!r} is longer than the aggregate retention")
+        self.expire(now)
+
+        start_hour = math.floor((now - span).timestamp() / BUCKET_SECONDS)
+        total = _Bucket()
+        # Oldest posts first, so tied trends keep their order of first appearance
+        for post in boundary_posts or []:
+            total.add(post, _post_trends(post, vocabulary))
+        with self._lock:
+            for hour in sorted(self._buckets):
+                if hour > start_hour:
+                    bucket = self._buckets[hour]
+                    total.posts += bucket.posts
+                    total.sentiment.update(bucket.sentiment)
+                    total.trends.update(bucket.trends)
+            total.posts += self._undated.posts
+            total.sentiment.update(self._undated.sentiment)
+            total.trends.update(self._undated.trends)
+
+        return {
+            'post_count': total.posts,
+            'sentiment_mix': {sentiment: total.sentiment.get(sentiment, 0) for sentiment in SENTIMENTS},
+            'trend_counts': total.trends
+        }
+
+    @staticmethod
+    def boundary(window: Union[int, float, str, timedelta] = 48,
+                 now: Optional[datetime] = None) -> Tuple[datetime, datetime]:
+        """(since, until) of the partial hour at the start of `window`, for fetching boundary posts."""
+        since = (now or datetime.now(timezone.utc)) - parse_window(window)
+        hour_end = (math.floor(since.timestamp() / BUCKET_SECONDS) + 1) * BUCKET_SECONDS
+        until = datetime.fromtimestamp(hour_end, timezone.utc) - timedelta(microseconds=1)
+        return since, until
+
+
+def _post_trends(post: Dict, vocabulary: Optional[TrendVocabulary]) -> List[str]:
+    """Normalized trends of a post, from its stored ids when possible."""
+    if vocabulary is not None and 'trend_ids' in post:
+        return vocabulary.decode(post['trend_ids'])
+    trends = (normalize_trend(trend) for trend in split_trends(post.get('trends')))
+    return [trend for trend in trends if trend is not None]
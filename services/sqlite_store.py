@@ -0,0 +1,179 @@
+"""
+SQLite backend for the post cache.
+
+Posts are stored one row each, with indexed `post_id`, `channel_id` and
+`published_at` columns next to the full post as JSON, so lookups and inserts
+no longer touch the whole cache. The database runs in WAL mode so readers
+don't block the writer.
+"""
+import os
+import json
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from services.post_store import PostStore, empty_cache, file_signature, parse_timestamp
+
+# SQLite's default limit on bound parameters per statement is 999
+_MAX_PARAMS = 900
+
+
+def _index_timestamp(value: str) -> Optional[str]:
+    """Normalize a timestamp to a sortable UTC string for the published_at index."""
+    parsed = parse_timestamp(value)
+    if parsed is None:
+        return None
+    return parsed.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+class SqlitePostStore(PostStore):
+    """Indexed SQLite backend (`data/posts.db`)."""
+
+    def __init__(self, path: str = 'data/posts.db', legacy_json_path: Optional[str] = 'data/posts.json'):
+        self.path = path
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._create_schema()
+
+        if legacy_json_path:
+            self._import_legacy_json(legacy_json_path)
+
+    def _create_schema(self) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS posts ("
+                " post_id TEXT PRIMARY KEY,"
+                " channel_id TEXT,"
+                " published_at TEXT,"
+                " data TEXT NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_posts_channel ON posts (channel_id)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_posts_published ON posts (published_at)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+
+    def _import_legacy_json(self, json_path: str) -> None:
+        """One-time import of an existing posts.json into an empty database."""
+        if not os.path.exists(json_path) or self.get_meta().get('last_updated'):
+            return
+        try:
+            with open(json_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        data.setdefault('posts', [])
+        data.setdefault('meta', {})['last_updated'] = datetime.now().isoformat()
+        self.save(data)
+
+    def _rows(self, posts: List[Dict]) -> List[tuple]:
+        return [
+            (post['post_id'], post.get('channel_id'), _index_timestamp(post.get('published_at')),
+             json.dumps(post, ensure_ascii=False))
+            for post in posts
+        ]
+
+    def _write_meta(self, meta: Dict) -> None:
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+            [(key, json.dumps(value)) for key, value in meta.items()]
+        )
+
+    def _count(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM posts").fetchone()[0]
+
+    def signature(self) -> tuple:
+        return file_signature(self.path, f"{self.path}-wal")
+
+    def load(self) -> Dict:
+        with self._lock:
+            rows = self._conn.execute("SELECT data FROM posts ORDER BY rowid").fetchall()
+        return {
+            "posts": [json.loads(row[0]) for row in rows],
+            "meta": self.get_meta()
+        }
+
+    def save(self, data: Dict) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM posts")
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO posts (post_id, channel_id, published_at, data) VALUES (?, ?, ?, ?)",
+                self._rows(data.get('posts', []))
+            )
+            self._write_meta(dict(data.get('meta', {}), total_posts=self._count()))
+
+    def get_meta(self) -> Dict:
+        with self._lock:
+            rows = self._conn.execute("SELECT key, value FROM meta").fetchall()
+        meta = empty_cache()['meta']
+        meta.update({key: json.loads(value) for key, value in rows})
+        return meta
+
+    def update_meta(self, updates: Dict) -> None:
+        with self._lock, self._conn:
+            self._write_meta(updates)
+
+    def known_ids(self, post_ids: Iterable[str]) -> Set[str]:
+        post_ids = list(post_ids)
+        known = set()
+        with self._lock:
+            for start in range(0, len(post_ids), _MAX_PARAMS):
+                chunk = post_ids[start:start + _MAX_PARAMS]
+                placeholders = ','.join('?' * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT post_id FROM posts WHERE post_id IN ({placeholders})", chunk
+                ).fetchall()
+                known.update(row[0] for row in rows)
+        return known
+
+    def add_posts(self, posts: List[Dict], meta_updates: Dict) -> None:
+        total = self.get_meta().get('total_posts') or 0
+        with self._lock, self._conn:
+            cursor = self._conn.executemany(
+                "INSERT OR IGNORE INTO posts (post_id, channel_id, published_at, data) VALUES (?, ?, ?, ?)",
+                self._rows(posts)
+            )
+            self._write_meta(dict(meta_updates, total_posts=total + max(cursor.rowcount, 0)))
+
+    def iter_posts(self, since: Optional[datetime] = None, until: Optional[datetime] = None,
+                   chunk_size: int = 1000) -> Iterator[List[Dict]]:
+        # A separate connection reads one consistent WAL snapshot without
+        # holding the writer's lock between chunks
+        conditions = []
+        params = []
+        for op, bound in (('>=', since), ('<=', until)):
+            if bound is not None:
+                conditions.append(f"published_at {op} ?")
+                params.append(bound.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'))
+        # Date ranges walk the published_at index, oldest first
+        query = ("SELECT data FROM posts WHERE " + " AND ".join(conditions) + " ORDER BY published_at"
+                 if conditions else "SELECT data FROM posts ORDER BY rowid")
+
+        conn = sqlite3.connect(self.path)
+        try:
+            cursor = conn.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield [json.loads(row[0]) for row in rows]
+        finally:
+            conn.close()
+
+    def published_range(self) -> Tuple[int, Optional[datetime], Optional[datetime]]:
+        with self._lock:
+            count, first, last = self._conn.execute(
+                "SELECT COUNT(*), MIN(published_at), MAX(published_at) FROM posts"
+            ).fetchone()
+        return count, parse_timestamp(first), parse_timestamp(last)
+
+    def clear(self) -> bool:
+        with self._lock, self._conn:
+            had_posts = self._count() > 0
+            self._conn.execute("DELETE FROM posts")
+            self._conn.execute("DELETE FROM meta")
+            # Keep last_updated so the legacy JSON file isn't imported again
+            self._write_meta({'last_updated': datetime.now().isoformat()})
+        return had_posts
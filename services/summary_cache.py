@@ -0,0 +1,125 @@
+"""
+Persistent memoization of AI summaries.
+
+Results are keyed by a hash of the input text, niche, model name and prompt
+version, so re-running a channel whose videos were already summarized costs
+no API calls. Entries expire after a TTL and the least recently used entries
+are evicted once the cache grows past its size limit.
+"""
+import os
+import json
+import hashlib
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+SUMMARY_CACHE_FILE = 'data/summary_cache.db'
+
+
+def make_summary_key(text: str, niche: str, model_name: str, prompt_version: str) -> str:
+    """Content-addressed key for a summarization request."""
+    digest = hashlib.sha256()
+    for part in (text, niche.strip().lower(), model_name, prompt_version):
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class SummaryCache:
+    """SQLite-backed LRU/TTL cache of summary results."""
+
+    def __init__(self, path: str = SUMMARY_CACHE_FILE, max_entries: int = 20000, ttl_hours: float = 24 * 30):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_hours * 3600
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS summaries ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_summaries_accessed ON summaries (accessed_at)")
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Return the cached result for `key`, or None on a miss or expired entry."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM summaries WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None or now - row[1] > self.ttl_seconds:
+                if row is not None:
+                    self._conn.execute("DELETE FROM summaries WHERE key = ?", (key,))
+                    self._conn.commit()
+                self.misses += 1
+                return None
+
+            self._conn.execute("UPDATE summaries SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return json.loads(row[0])
+
+    def put(self, key: str, value: Dict) -> None:
+        """Store a result and evict old entries if needed."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO summaries (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), now, now)
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now: float) -> None:
+        self._conn.execute("DELETE FROM summaries WHERE created_at < ?", (now - self.ttl_seconds,))
+        count = self._conn.execute("SELECT COUNT(*) FROM summaries").fetchone()[0]
+        if count > self.max_entries:
+            self._conn.execute(
+                "DELETE FROM summaries WHERE key IN ("
+                " SELECT key FROM summaries ORDER BY accessed_at ASC LIMIT ?)",
+                (count - self.max_entries,)
+            )
+
+    def clear(self) -> None:
+        """Remove every cached summary."""
+        with self._lock:
+            self._conn.execute("DELETE FROM summaries")
+            self._conn.commit()
+
+    def stats(self) -> Dict:
+        """Hit/miss counters for this process and the number of stored entries."""
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM summaries").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': size
+        }
+
+
+_cache: Optional[SummaryCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_summary_cache() -> SummaryCache:
+    """Return the process-wide summary cache."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = SummaryCache(
+                max_entries=int(os.getenv('SUMMARY_CACHE_MAX_ENTRIES', 20000)),
+                ttl_hours=float(os.getenv('SUMMARY_CACHE_TTL_HOURS', 24 * 30))
+            )
+        return _cache
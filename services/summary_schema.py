@@ -0,0 +1,106 @@
+"""
+Schema and validation for AI summary responses.
+
+The same schema is sent to the providers' structured-output features and
+used to validate whatever comes back, so a malformed response is rejected
+instead of being stored as a real summary.
+"""
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+SENTIMENTS = ('positive', 'neutral', 'negative')
+
+MAX_SUMMARY_CHARS = 300
+MAX_TRENDS = 5
+
+SUMMARY_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'summary': {'type': 'string'},
+        'sentiment': {'type': 'string', 'enum': list(SENTIMENTS)},
+        'trends': {'type': 'array', 'items': {'type': 'string'}}
+    },
+    'required': ['summary', 'sentiment', 'trends']
+}
+
+BATCH_SCHEMA = {
+    'type': 'array',
+    'items': {
+        'type': 'object',
+        'properties': dict(SUMMARY_SCHEMA['properties'], post_id={'type': 'string'}),
+        'required': ['post_id'] + SUMMARY_SCHEMA['required']
+    }
+}
+
+
+class SummaryValidationError(ValueError):
+    """An AI response that doesn't match the summary schema."""
+
+
+@dataclass(frozen=True)
+class SummaryResult:
+    """A validated summary; `to_dict` gives the dictionary the rest of the app uses."""
+
+    summary: str
+    sentiment: str
+    trends: List[str] = field(default_factory=list)
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'SummaryResult':
+        """
+        Validate and normalize a parsed response object.
+
+        Raises:
+            SummaryValidationError: If a field is missing or has the wrong type
+        """
+        if not isinstance(data, dict):
+            raise SummaryValidationError(f"expected an object, got {type(data).__name__}")
+
+        summary = data.get('summary')
+        if not isinstance(summary, str) or not summary.strip():
+            raise SummaryValidationError("summary must be a non-empty string")
+
+        sentiment = data.get('sentiment')
+        if not isinstance(sentiment, str) or sentiment.strip().lower() not in SENTIMENTS:
+            raise SummaryValidationError(f"sentiment must be one of {', '.join(SENTIMENTS)}")
+
+        trends = data.get('trends')
+        if not isinstance(trends, list) or not all(isinstance(trend, str) for trend in trends):
+            raise SummaryValidationError("trends must be a list of strings")
+
+        return cls(
+            summary=summary.strip()[:MAX_SUMMARY_CHARS],
+            sentiment=sentiment.strip().lower(),
+            trends=[trend.strip() for trend in trends if trend.strip()][:MAX_TRENDS]
+        )
+
+    def to_dict(self) -> Dict:
+        return {'summary': self.summary, 'sentiment': self.sentiment, 'trends': list(self.trends)}
+
+
+def validate_summary(data: Dict) -> Optional[Dict]:
+    """Validated result dictionary for `data`, or None if it doesn't match the schema."""
+    try:
+        return SummaryResult.from_dict(data).to_dict()
+    except SummaryValidationError:
+        return None
+
+
+def openai_response_format(name: str = 'video_summary') -> Dict:
+    """OpenAI `response_format` enforcing SUMMARY_SCHEMA (strict mode needs closed objects)."""
+    return {
+        'type': 'json_schema',
+        'json_schema': {
+            'name': name,
+            'strict': True,
+            'schema': dict(SUMMARY_SCHEMA, additionalProperties=False)
+        }
+    }
+
+
+def gemini_generation_config(batch: bool = False) -> Dict:
+    """Gemini `generation_config` asking for JSON matching the summary (or batch) schema."""
+    return {
+        'response_mime_type': 'application/json',
+        'response_schema': BATCH_SCHEMA if batch else SUMMARY_SCHEMA
+    }
@@ -0,0 +1,244 @@
+"""
+Shrink video text before it is sent to the LLM.
+
+Descriptions are mostly links, chapter lists, sponsor reads and the same
+footer on every upload. `compact_channel_texts` strips the generic noise
+and drops lines that recur across a channel's videos, detected by how many
+of that channel's videos share each word n-gram.
+"""
+import os
+import re
+import json
+import threading
+import zlib
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+from services.rate_limiter import estimate_tokens
+
+BOILERPLATE_FILE = 'data/boilerplate_ngrams.json'
+
+# Word n-gram size used to match boilerplate lines across videos
+NGRAM_SIZE = 4
+
+# An n-gram is boilerplate once it appears in this many of a channel's videos...
+BOILERPLATE_MIN_VIDEOS = 2
+# ...and in at least this share of them
+BOILERPLATE_MIN_SHARE = 0.5
+
+# A line is dropped when this share of its n-grams is boilerplate
+BOILERPLATE_LINE_SHARE = 0.6
+
+# Only a channel's latest videos count; older ones are forgotten
+MAX_VIDEOS_PER_CHANNEL = 200
+
+_URL_PATTERN = re.compile(r'(?:https?://|www\.)\S+', re.IGNORECASE)
+_HANDLE_PATTERN = re.compile(r'(?<!\w)@[\w.]+')
+_TIMESTAMP_PATTERN = re.compile(r'^\s*[(\[]?(?:\d{1,2}:)?\d{1,2}:\d{2}[)\]]?\s*[-–—:|.)]*\s*')
+# Calls to action only: lines that merely mention Patreon, merch or affiliates
+# can be the very topic of a video
+_PROMO_PATTERN = re.compile(
+    r'\b(?:use (?:my |our |the )?code|promo code|discount code|coupon code|sponsored by'
+    r'|thanks to .{0,40} for sponsoring|(?:are|may be|contains?|includes?) affiliate links?'
+    r'|(?:please |don\'t forget to |make sure to |hit (?:the )?)subscribe|subscribe (?:to|for)\b'
+    r'|turn on (?:post )?notifications|hit the bell|follow (?:me|us) on|join (?:this|my|our) channel'
+    r'|support (?:me|us|the channel|this channel) on|become a (?:patron|member)'
+    r'|(?:check out|get|grab|buy) (?:my|our|the) merch)\b'
+    r'|^subscribe\b',
+    re.IGNORECASE
+)
+_WORD_PATTERN = re.compile(r'\w+')
+
+_channels: Optional[Dict[str, Dict]] = None
+_channels_dirty = False
+_channels_lock = threading.Lock()
+_save_lock = threading.Lock()
+
+_token_counts = Counter()
+_token_lock = threading.Lock()
+
+
+def strip_noise(text: str) -> str:
+    """
+    Remove links, social handles, sponsor/promo lines and duplicate lines.
+
+    Chapter lists are collapsed to a single line of chapter titles.
+    """
+    lines = []
+    chapters = []
+    seen = set()
+    for line in text.splitlines():
+        timestamp = _TIMESTAMP_PATTERN.match(line)
+        if timestamp:
+            title = _URL_PATTERN.sub('', line[timestamp.end():]).strip()
+            if title:
+                chapters.append(title)
+            continue
+
+        had_link = bool(_URL_PATTERN.search(line) or _HANDLE_PATTERN.search(line))
+        cleaned = _HANDLE_PATTERN.sub('', _URL_PATTERN.sub('', line))
+        cleaned = ' '.join(cleaned.split()).strip(' -–—:|•')
+
+        if not cleaned or _PROMO_PATTERN.search(cleaned):
+            continue
+        # "Instagram:", "My gear ->" and other labels for links that were removed
+        if had_link and len(cleaned.split()) <= 4:
+            continue
+
+        key = cleaned.lower()
+        if key not in seen:
+            seen.add(key)
+            lines.append(cleaned)
+
+    if chapters:
+        lines.append('Chapters: ' + '; '.join(chapters))
+    return '\n'.join(lines)
+
+
+def _line_ngrams(line: str) -> List[str]:
+    words = _WORD_PATTERN.findall(line.lower())
+    if not words:
+        return []
+    if len(words) < NGRAM_SIZE:
+        grams = [' '.join(words)]
+    else:
+        grams = [' '.join(words[i:i + NGRAM_SIZE]) for i in range(len(words) - NGRAM_SIZE + 1)]
+    # Stable short keys keep the on-disk table small
+    return [format(zlib.crc32(gram.encode('utf-8')), 'x') for gram in grams]
+
+
+def _load_channels() -> Dict[str, Dict]:
+    """
+    Per-channel n-grams of each retained video, and how many videos share each.
+
+    Only the per-video n-grams are stored; the counts are rebuilt from them.
+    """
+    global _channels
+    if _channels is None:
+        saved = {}
+        if os.path.exists(BOILERPLATE_FILE):
+            try:
+                with open(BOILERPLATE_FILE, 'r', encoding='utf-8') as f:
+                    saved = json.load(f)
+            except (OSError, ValueError):
+                pass
+        _channels = {}
+        for channel_id, channel in saved.items():
+            videos = channel.get('videos') if isinstance(channel, dict) else None
+            # Older files kept only running totals, which can't be aged out; those channels start over
+            if isinstance(videos, dict):
+                _channels[channel_id] = {
+                    'videos': videos,
+                    'ngrams': Counter(gram for grams in videos.values() for gram in grams)
+                }
+    return _channels
+
+
+def save_boilerplate() -> None:
+    """
+    Write the channels' n-gram statistics to disk if they changed.
+
+    Called once at the end of a run; the file is replaced atomically and
+    written outside the lock, so fetches carry on while it is saved.
+    """
+    global _channels_dirty
+    with _channels_lock:
+        if not _channels_dirty:
+            return
+        content = json.dumps({channel_id: {'videos': channel['videos']} for channel_id, channel in _channels.items()})
+        _channels_dirty = False
+
+    with _save_lock:
+        try:
+            os.makedirs(os.path.dirname(BOILERPLATE_FILE), exist_ok=True)
+            tmp_path = f"{BOILERPLATE_FILE}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(content)
+            os.replace(tmp_path, BOILERPLATE_FILE)
+        except OSError:
+            with _channels_lock:
+                _channels_dirty = True
+
+
+def _update_channel(channel: Dict, video_id: str, lines: List[str]) -> None:
+    """Count each n-gram once per video, over the channel's latest MAX_VIDEOS_PER_CHANNEL videos."""
+    videos = channel['videos']
+    if video_id in videos:
+        return
+    grams = sorted({gram for line in lines for gram in _line_ngrams(line)})
+    videos[video_id] = grams
+    ngrams = channel['ngrams']
+    ngrams.update(grams)
+
+    # Videos are kept in the order they were added; the oldest leave first
+    while len(videos) > MAX_VIDEOS_PER_CHANNEL:
+        for gram in videos.pop(next(iter(videos))):
+            ngrams[gram] -= 1
+            if ngrams[gram] <= 0:
+                del ngrams[gram]
+
+
+def _is_boilerplate(channel: Dict, line: str) -> bool:
+    grams = _line_ngrams(line)
+    if not grams:
+        return False
+    threshold = max(BOILERPLATE_MIN_VIDEOS, BOILERPLATE_MIN_SHARE * len(channel['videos']))
+    common = sum(1 for gram in grams if channel['ngrams'].get(gram, 0) >= threshold)
+    return common / len(grams) >= BOILERPLATE_LINE_SHARE
+
+
+def compact_channel_texts(channel_id: str, videos: List[Tuple[str, str]]) -> List[str]:
+    """
+    Compact the descriptions of one channel's videos.
+
+    The videos are added to the channel's n-gram statistics first, so
+    boilerplate shared within this batch is caught too.
+
+    Args:
+        channel_id: YouTube channel ID the videos belong to
+        videos: List of (video_id, description) pairs
+
+    Returns:
+        Compacted descriptions, in the same order
+    """
+    global _channels_dirty
+    stripped = [strip_noise(description) for _, description in videos]
+
+    with _channels_lock:
+        channel = _load_channels().setdefault(channel_id, {'videos': {}, 'ngrams': Counter()})
+        for (video_id, _), text in zip(videos, stripped):
+            _update_channel(channel, video_id, text.splitlines())
+
+        compacted = [
+            '\n'.join(line for line in text.splitlines() if not _is_boilerplate(channel, line))
+            for text in stripped
+        ]
+        if videos:
+            _channels_dirty = True
+    return compacted
+
+
+def record_compaction(before: str, after: str) -> None:
+    """Add one prompt's estimated token counts, before and after compaction."""
+    with _token_lock:
+        _token_counts['texts'] += 1
+        _token_counts['tokens_before'] += estimate_tokens(before)
+        _token_counts['tokens_after'] += estimate_tokens(after)
+
+
+def get_compaction_stats() -> Dict:
+    """
+    Estimated prompt tokens before and after compaction for this process.
+
+    Returns:
+        Dictionary with texts, tokens_before, tokens_after and saved_fraction
+    """
+    with _token_lock:
+        counts = dict(_token_counts)
+    before = counts.get('tokens_before', 0)
+    after = counts.get('tokens_after', 0)
+    return {
+        'texts': counts.get('texts', 0),
+        'tokens_before': before,
+        'tokens_after': after,
+        'saved_fraction': 1 - after / before if before else 0.0
+    }
@@ -0,0 +1,251 @@
+"""
+Merge near-duplicate trends into clusters.
+
+Phrases that only differ in word order, plurals, "-ing" forms, spacing or
+hyphens ("mobile gaming" / "mobile games", "e-sports" / "esports") share an
+exact key and always merge. Other phrases are embedded as hashed,
+IDF-weighted character n-gram vectors (CPU-only, numpy) and clustered
+incrementally: each new phrase joins the most similar cluster leader with
+the same number of words, found through a random-hyperplane LSH index, or
+starts a new cluster. The threshold is strict because n-grams rate related
+words ("production" / "productivity", 0.80) above most misspellings
+("subscribers" / "subscibers", 0.76), so this path only merges near-identical
+spellings. Vectors and assignments are cached for the life of the process,
+so only phrases never seen before are embedded.
+"""
+import os
+import re
+import threading
+import zlib
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+
+# Hashed feature dimensions per phrase vector
+EMBEDDING_DIM = 256
+
+# LSH index: tables x bits per table (a leader at cosine 0.9 shares a bucket
+# with the phrase 98% of the time; with 8 x 12 it was 74%)
+LSH_TABLES = 16
+LSH_BITS = 10
+
+# Cosine similarity a one-word phrase needs with a cluster leader to join the
+# cluster. Each word counts equally, so one misspelt word among n moves the
+# similarity n times less; longer phrases need 1 - (1 - threshold) / n.
+SIMILARITY_THRESHOLD = float(os.getenv('TREND_SIMILARITY_THRESHOLD', 0.82))
+
+CHAR_NGRAM = 3
+
+_STOPWORDS = frozenset('a an and at by for from in into of on or the to vs with'.split())
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+_VOWELS = frozenset('aeiouy')
+
+# Default for merging near-duplicate trends; callers pass their own choice
+MERGE_TRENDS_DEFAULT = os.getenv('TREND_CLUSTERING', '1') != '0'
+
+
+def _stem(token: str) -> str:
+    """
+    Crude suffix folding: plurals, "-ing" and a final "e".
+
+    "stories" -> "story", "gaming" / "games" -> "gam", "betting" -> "bet",
+    "streaming" / "streams" -> "stream".
+    """
+    if len(token) > 4 and token.endswith('ies'):
+        return token[:-3] + 'y'
+    if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+        token = token[:-1]
+    if len(token) > 5 and token.endswith('ing') and _VOWELS & set(token[:-3]):
+        token = token[:-3]
+        if token[-1] == token[-2] and token[-1] not in 'aeiouylsz':
+            token = token[:-1]
+    elif len(token) > 3 and token.endswith('e'):
+        token = token[:-1]
+    return token
+
+
+def phrase_tokens(phrase: str) -> List[str]:
+    """Content words of a phrase, stemmed (falls back to all words for all-stopword phrases)."""
+    tokens = _TOKEN_RE.findall(phrase.lower())
+    content = [token for token in tokens if token not in _STOPWORDS] or tokens
+    return [_stem(token) for token in content]
+
+
+def phrase_key(phrase: str) -> str:
+    """Word-order-insensitive key; phrases with equal keys always share a cluster."""
+    return ' '.join(sorted(set(phrase_tokens(phrase)))) or phrase
+
+
+def joined_key(phrase: str) -> str:
+    """Words run together; spacing and hyphen variants ("chat gpt" / "chatgpt") share it."""
+    return ''.join(phrase_tokens(phrase)) or phrase
+
+
+def _features(phrase: str) -> List[List[int]]:
+    """Hashed char n-grams of each padded word plus the word itself, one list per word."""
+    tokens = phrase_tokens(phrase) or [phrase]
+    features = []
+    for token in tokens:
+        padded = f'<{token}>'
+        grams = [padded[i:i + CHAR_NGRAM] for i in range(max(1, len(padded) - CHAR_NGRAM + 1))]
+        grams.append(f'w:{token}')
+        features.append([zlib.crc32(gram.encode('utf-8')) for gram in grams])
+    return features
+
+
+class TrendClusterer:
+    """Incremental leader clustering of trend phrases over an LSH index."""
+
+    def __init__(self, threshold: float = SIMILARITY_THRESHOLD, seed: int = 0):
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        rng = np.random.default_rng(seed)
+        self._planes = rng.standard_normal((EMBEDDING_DIM, LSH_TABLES * LSH_BITS)).astype(np.float32)
+        self._bit_weights = 1 << np.arange(LSH_BITS, dtype=np.int64)
+        self._tables: List[Dict[int, List[int]]] = [{} for _ in range(LSH_TABLES)]
+
+        # Document frequency of each hashed feature, for IDF weights
+        self._df = np.zeros(EMBEDDING_DIM, dtype=np.int64)
+        self._phrases = 0
+
+        self._leaders = np.zeros((64, EMBEDDING_DIM), dtype=np.float32)
+        self._leader_labels: List[str] = []
+        self._leader_words = np.zeros(64, dtype=np.int64)
+        self._cluster_of: Dict[str, int] = {}
+        self._key_cluster: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._cluster_of)
+
+    @property
+    def cluster_count(self) -> int:
+        return len(self._leader_labels)
+
+    def _embed(self, phrases: Sequence[str]) -> np.ndarray:
+        """
+        Unit vectors for new phrases, updating document frequencies first.
+
+        Each word gets its own unit-length IDF-weighted n-gram vector before
+        the words are summed, so long words don't outweigh short ones.
+        """
+        words = [_features(phrase) for phrase in phrases]
+        hashed = [np.asarray(grams, dtype=np.int64) for phrase_words in words for grams in phrase_words]
+        word_rows = np.repeat(np.arange(len(hashed)), [len(h) for h in hashed])
+        hashes = np.concatenate(hashed)
+        columns = hashes % EMBEDDING_DIM
+        signs = np.where(hashes >> 31, -1.0, 1.0).astype(np.float32)
+
+        for phrase_words in words:
+            self._df[np.unique([gram % EMBEDDING_DIM for grams in phrase_words for gram in grams])] += 1
+        self._phrases += len(phrases)
+        idf = (np.log((1 + self._phrases) / (1 + self._df)) + 1).astype(np.float32)
+
+        word_vectors = np.zeros((len(hashed), EMBEDDING_DIM), dtype=np.float32)
+        np.add.at(word_vectors, (word_rows, columns), signs * idf[columns])
+        word_vectors /= np.maximum(np.linalg.norm(word_vectors, axis=1, keepdims=True), 1e-12)
+
+        vectors = np.zeros((len(phrases), EMBEDDING_DIM), dtype=np.float32)
+        np.add.at(vectors, np.repeat(np.arange(len(phrases)), [len(w) for w in words]), word_vectors)
+        return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+    def _signatures(self, vectors: np.ndarray) -> np.ndarray:
+        bits = (vectors @ self._planes > 0).reshape(len(vectors), LSH_TABLES, LSH_BITS)
+        return bits.astype(np.int64) @ self._bit_weights
+
+    def _nearest(self, vector: np.ndarray, signature: np.ndarray, words: int) -> Optional[int]:
+        candidates = set()
+        for table, key in zip(self._tables, signature.tolist()):
+            candidates.update(table.get(key, ()))
+        if not candidates:
+            return None
+        ids = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+        # A missing or extra word scores like a misspelt one, so only equal word counts compare
+        ids = ids[self._leader_words[ids] == words]
+        if not len(ids):
+            return None
+        similarities = self._leaders[ids] @ vector
+        best = int(np.argmax(similarities))
+        threshold = 1 - (1 - self.threshold) / max(words, 1)
+        return int(ids[best]) if similarities[best] >= threshold else None
+
+    def _new_cluster(self, label: str, vector: np.ndarray, signature: np.ndarray, words: int) -> int:
+        cluster_id = len(self._leader_labels)
+        if cluster_id == len(self._leaders):
+            self._leaders = np.concatenate([self._leaders, np.zeros_like(self._leaders)])
+            self._leader_words = np.concatenate([self._leader_words, np.zeros_like(self._leader_words)])
+        self._leaders[cluster_id] = vector
+        self._leader_words[cluster_id] = words
+        self._leader_labels.append(label)
+        for table, key in zip(self._tables, signature.tolist()):
+            table.setdefault(key, []).append(cluster_id)
+        return cluster_id
+
+    def _add(self, phrases: List[str]) -> None:
+        vectors = self._embed(phrases)
+        signatures = self._signatures(vectors)
+        for phrase, vector, signature in zip(phrases, vectors, signatures):
+            keys = (phrase_key(phrase), 'joined:' + joined_key(phrase))
+            cluster_id = next((self._key_cluster[key] for key in keys if key in self._key_cluster), None)
+            if cluster_id is None:
+                cluster_id = self._nearest(vector, signature, len(phrase_tokens(phrase)))
+            if cluster_id is None:
+                cluster_id = self._new_cluster(phrase, vector, signature, len(phrase_tokens(phrase)))
+            for key in keys:
+                self._key_cluster.setdefault(key, cluster_id)
+            self._cluster_of[phrase] = cluster_id
+
+    def assign(self, phrases: Iterable[str]) -> np.ndarray:
+        """Cluster id of each phrase, clustering phrases not seen before."""
+        phrases = list(phrases)
+        with self._lock:
+            new = [phrase for phrase in dict.fromkeys(phrases) if phrase not in self._cluster_of]
+            if new:
+                self._add(new)
+            return np.fromiter((self._cluster_of[phrase] for phrase in phrases), dtype=np.int64, count=len(phrases))
+
+    def groups(self, phrases: Sequence[str],
+               weights: Optional[Sequence[float]] = None) -> Tuple[np.ndarray, List[str]]:
+        """
+        Dense group numbers for a list of phrases, e.g. a trend vocabulary.
+
+        Args:
+            phrases: Phrases to group
+            weights: Optional count per phrase (e.g. mentions)
+
+        Returns:
+            Tuple of (group per phrase, label per group). Groups are numbered
+            in the order their first phrase appears; each is labelled with its
+            most common phrase by `weights`, the earliest among ties
+        """
+        clusters = self.assign(phrases)
+        _, first, groups = np.unique(clusters, return_index=True, return_inverse=True)
+        order = np.argsort(first, kind='stable')
+        renumber = np.empty_like(order)
+        renumber[order] = np.arange(len(order))
+        groups = renumber[groups]
+
+        weights = np.zeros(len(phrases)) if weights is None else np.asarray(weights, dtype=np.float64)
+        by_weight = np.lexsort((np.arange(len(phrases)), -weights))
+        _, best = np.unique(groups[by_weight], return_index=True)
+        return groups, [phrases[i] for i in by_weight[best]]
+
+    def leader(self, cluster_id: int) -> str:
+        """First phrase of a cluster."""
+        return self._leader_labels[cluster_id]
+
+    def stats(self) -> Tuple[int, int]:
+        """(phrases seen, clusters)."""
+        with self._lock:
+            return len(self._cluster_of), len(self._leader_labels)
+
+
+_clusterer: Optional[TrendClusterer] = None
+_clusterer_lock = threading.Lock()
+
+
+def get_trend_clusterer() -> TrendClusterer:
+    """Return the process-wide trend clusterer."""
+    global _clusterer
+    with _clusterer_lock:
+        if _clusterer is None:
+            _clusterer = TrendClusterer()
+        return _clusterer
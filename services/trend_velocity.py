@@ -0,0 +1,195 @@
+"""
+Emerging-trend detection from trend counts over time.
+
+Every (publish time, trend id) pair is kept in NumPy arrays that grow as
+posts are ingested. Counts per trend are binned into consecutive windows
+(24h by default) ending now; the latest window is compared with the one
+before it (velocity, acceleration) and with a trailing baseline of earlier
+windows (z-score).
+"""
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Sequence
+import numpy as np
+from services.post_store import parse_timestamp
+from services.post_columns import ColumnarPosts
+from services.trend_vocab import TrendVocabulary, split_trends
+
+WINDOW_HOURS = 24
+BASELINE_WINDOWS = 28
+
+# A trend is emerging when its latest window is this many standard
+# deviations above its baseline, with at least MIN_COUNT mentions
+Z_THRESHOLD = 2.0
+MIN_COUNT = 3
+
+# Baseline windows of history needed before anything is called emerging
+MIN_HISTORY_WINDOWS = 3
+
+
+class TrendVelocity:
+    """Append-only trend event log with windowed velocity, acceleration and z-scores."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._times = np.empty(0, dtype=np.int64)
+        self._ids = np.empty(0, dtype=np.int64)
+        self._pending: List[tuple] = []
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._times) + sum(len(times) for times, _ in self._pending)
+
+    @classmethod
+    def from_posts(cls, posts: Iterable[Dict], vocabulary: TrendVocabulary) -> 'TrendVelocity':
+        velocity = cls()
+        velocity.add_posts(posts, vocabulary)
+        return velocity
+
+    def add_posts(self, posts: Iterable[Dict], vocabulary: TrendVocabulary) -> None:
+        """Record the trends of new posts (posts without a parseable date are skipped)."""
+        if isinstance(posts, ColumnarPosts):
+            # Stored ids and epoch times can be taken over as arrays
+            times, ids = posts.trend_events()
+            if len(ids):
+                with self._lock:
+                    self._pending.append((times, ids))
+            posts = posts.without_trend_ids()
+
+        times = []
+        ids = []
+        for post in posts:
+            published = parse_timestamp(post.get('published_at'))
+            if published is None:
+                continue
+            if 'trend_ids' in post:
+                trend_ids = post['trend_ids']
+            else:
+                trend_ids = [vocabulary.get_id(trend) for trend in split_trends(post.get('trends'))]
+                trend_ids = [trend_id for trend_id in trend_ids if trend_id is not None]
+            times.extend([int(published.timestamp())] * len(trend_ids))
+            ids.extend(trend_ids)
+        if ids:
+            with self._lock:
+                self._pending.append((np.asarray(times, dtype=np.int64), np.asarray(ids, dtype=np.int64)))
+
+    def _events(self):
+        with self._lock:
+            if self._pending:
+                self._times = np.concatenate([self._times] + [times for times, _ in self._pending])
+                self._ids = np.concatenate([self._ids] + [ids for _, ids in self._pending])
+                self._pending = []
+            return self._times, self._ids
+
+    def history_windows(self, now: Optional[datetime] = None, window_hours: float = WINDOW_HOURS) -> int:
+        """Number of whole windows before the newest one that the event log reaches back into."""
+        times, _ = self._events()
+        if not len(times):
+            return 0
+        now_ts = int((now or datetime.now(timezone.utc)).timestamp())
+        return max(0, int((now_ts - int(times.min())) // int(window_hours * 3600)))
+
+    def window_counts(self, size: int, groups: Optional[np.ndarray] = None, now: Optional[datetime] = None,
+                      window_hours: float = WINDOW_HOURS, windows: int = BASELINE_WINDOWS + 1) -> np.ndarray:
+        """
+        Trend counts per window, newest window first.
+
+        Args:
+            size: Number of trend ids (or groups)
+            groups: Optional array mapping trend id to group id (e.g. merged trends)
+            now: End of the newest window (defaults to now)
+            window_hours: Window length in hours
+            windows: Number of windows
+
+        Returns:
+            Array of shape (windows, size)
+        """
+        times, ids = self._events()
+        now_ts = int((now or datetime.now(timezone.utc)).timestamp())
+        window_seconds = int(window_hours * 3600)
+
+        # Posts dated slightly in the future count as the newest window
+        bins = np.maximum(now_ts - times, 0) // window_seconds
+        # Ids newer than the caller's vocabulary are left out
+        keep = (bins < windows) & (ids < (len(groups) if groups is not None else size))
+        columns = ids[keep] if groups is None else groups[ids[keep]]
+        counts = np.bincount(bins[keep] * size + columns, minlength=windows * size)
+        return counts[:windows * size].reshape(windows, size)
+
+    def scores(self, size: int, groups: Optional[np.ndarray] = None, now: Optional[datetime] = None,
+               window_hours: float = WINDOW_HOURS, baseline_windows: int = BASELINE_WINDOWS) -> Dict[str, np.ndarray]:
+        """
+        Velocity, acceleration and z-score of every trend for the newest window.
+
+        Velocity is the change in count from the previous window, acceleration
+        the change in velocity. The z-score compares the newest window with the
+        mean and standard deviation of the `baseline_windows` before it (the
+        deviation is floored at sqrt(mean) and 1 so rare trends don't explode).
+        Windows older than the first recorded event are not part of the baseline.
+
+        Returns:
+            Dictionary of arrays indexed by trend id (or group): count,
+            previous, velocity, acceleration, baseline_mean and z_score
+        """
+        counts = self.window_counts(size, groups, now, window_hours, baseline_windows + 1).astype(np.float64)
+        current = counts[0]
+        previous = counts[1] if len(counts) > 1 else np.zeros(size)
+        before = counts[2] if len(counts) > 2 else np.zeros(size)
+
+        baseline = counts[1:1 + min(baseline_windows, self.history_windows(now, window_hours))]
+        mean = baseline.mean(axis=0) if len(baseline) else np.zeros(size)
+        std = baseline.std(axis=0) if len(baseline) else np.zeros(size)
+        std = np.maximum(std, np.maximum(np.sqrt(mean), 1.0))
+
+        return {
+            'count': current,
+            'previous': previous,
+            'velocity': current - previous,
+            'acceleration': (current - previous) - (previous - before),
+            'baseline_mean': mean,
+            'z_score': (current - mean) / std
+        }
+
+    def emerging(self, labels: Sequence[str], groups: Optional[np.ndarray] = None, top: int = 5,
+                 now: Optional[datetime] = None, window_hours: float = WINDOW_HOURS,
+                 baseline_windows: int = BASELINE_WINDOWS, z_threshold: float = Z_THRESHOLD,
+                 min_count: int = MIN_COUNT) -> List[Dict]:
+        """
+        Trends rising fastest against their own history.
+
+        Args:
+            labels: Trend string per id (or per group, if `groups` is given)
+            groups: Optional array mapping trend id to group id
+            top: Maximum number of trends to return
+            now: End of the newest window (defaults to now)
+            window_hours: Window length in hours
+            baseline_windows: Earlier windows forming the baseline
+            z_threshold: Minimum z-score
+            min_count: Minimum mentions in the newest window
+
+        Returns:
+            List of dictionaries with trend, count, previous, velocity,
+            acceleration and z_score, highest z-score first (empty until the
+            log covers MIN_HISTORY_WINDOWS baseline windows)
+        """
+        size = len(labels)
+        if not size or self.history_windows(now, window_hours) < MIN_HISTORY_WINDOWS:
+            return []
+        scores = self.scores(size, groups, now, window_hours, baseline_windows)
+
+        candidates = np.flatnonzero(
+            (scores['z_score'] >= z_threshold) & (scores['count'] >= min_count) & (scores['velocity'] > 0)
+        )
+        # Highest z-score first, then most mentions
+        order = np.lexsort((-scores['count'][candidates], -scores['z_score'][candidates]))
+        return [
+            {
+                'trend': labels[i],
+                'count': int(scores['count'][i]),
+                'previous': int(scores['previous'][i]),
+                'velocity': int(scores['velocity'][i]),
+                'acceleration': int(scores['acceleration'][i]),
+                'z_score': round(float(scores['z_score'][i]), 2)
+            }
+            for i in candidates[order][:top]
+        ]
@@ -0,0 +1,68 @@
+"""
+Canonical trend strings and the global trend dictionary.
+
+Posts store their trends as integer ids (`trend_ids`) into one vocabulary of
+normalized trend strings kept in the cache metadata, so aggregation counts
+integers instead of re-splitting and re-normalizing strings.
+"""
+import re
+from typing import Dict, Iterable, List, Optional, Sequence, Union
+
+# Leading articles dropped during normalization ("the metaverse" -> "metaverse")
+ARTICLE_PATTERN = r'^(?:the|a|an)\s+'
+_ARTICLE_RE = re.compile(ARTICLE_PATTERN)
+
+# Bump when normalization changes so stored trend ids are rebuilt
+TREND_IDS_VERSION = 1
+
+
+def normalize_trend(trend) -> Optional[str]:
+    """Canonical form of one trend (lowercase, trimmed, no leading article), or None if empty."""
+    if not isinstance(trend, str):
+        return None
+    normalized = _ARTICLE_RE.sub('', trend.strip().lower()).strip()
+    return normalized or None
+
+
+def split_trends(trends: Union[str, Iterable, None]) -> List:
+    """A post's raw trends as a list (stored posts join them with commas)."""
+    if isinstance(trends, str):
+        return trends.split(',')
+    if isinstance(trends, (list, tuple)):
+        return list(trends)
+    return []
+
+
+class TrendVocabulary:
+    """Bidirectional mapping between normalized trend strings and integer ids."""
+
+    def __init__(self, labels: Optional[Sequence[str]] = None):
+        self.labels: List[str] = list(labels or [])
+        self._ids: Dict[str, int] = {label: i for i, label in enumerate(self.labels)}
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    def encode(self, trends: Union[str, Iterable, None]) -> List[int]:
+        """Ids for a post's trends, adding unseen trends to the vocabulary."""
+        ids = []
+        for trend in split_trends(trends):
+            label = normalize_trend(trend)
+            if label is None:
+                continue
+            trend_id = self._ids.get(label)
+            if trend_id is None:
+                trend_id = len(self.labels)
+                self.labels.append(label)
+                self._ids[label] = trend_id
+            ids.append(trend_id)
+        return ids
+
+    def decode(self, trend_ids: Iterable[int]) -> List[str]:
+        """Normalized trend strings for a list of ids."""
+        return [self.labels[trend_id] for trend_id in trend_ids]
+
+    def get_id(self, trend: str) -> Optional[int]:
+        """Id of a trend (normalized first), or None if it has never been seen."""
+        label = normalize_trend(trend)
+        return self._ids.get(label) if label is not None else None
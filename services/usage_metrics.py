@@ -0,0 +1,196 @@
+"""
+Token, cost and latency accounting for AI summarization.
+
+`services.ai_summarize` reports every provider call and summary-cache hit
+here. Usage is aggregated per run, channel, niche and provider, and saved to
+`data/ai_usage.json` when a run finishes.
+"""
+import os
+import json
+import threading
+import uuid
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+USAGE_FILE = 'data/ai_usage.json'
+
+# USD per million prompt / completion tokens
+MODEL_PRICING = {
+    'gemini-1.5-flash': {'prompt': 0.075, 'completion': 0.30},
+    'gpt-4o-mini': {'prompt': 0.15, 'completion': 0.60},
+}
+
+# Finished runs kept on disk
+MAX_RUNS = 50
+
+DIMENSIONS = ('run', 'channel', 'niche', 'provider')
+
+
+def estimate_cost(model_name: str, prompt_tokens: int, completion_tokens: int) -> float:
+    """Estimated USD cost of a call (0 for models without pricing)."""
+    pricing = MODEL_PRICING.get(model_name)
+    if not pricing:
+        return 0.0
+    return (prompt_tokens * pricing['prompt'] + completion_tokens * pricing['completion']) / 1_000_000
+
+
+def _empty_bucket() -> Dict:
+    return {
+        'calls': 0,
+        'items': 0,
+        'cache_hits': 0,
+        'retries': 0,
+        'fallbacks': 0,
+        'failures': 0,
+        'prompt_tokens': 0,
+        'completion_tokens': 0,
+        'cost_usd': 0.0,
+        'latency_total': 0.0,
+        'latency_max': 0.0
+    }
+
+
+class UsageTracker:
+    """Thread-safe usage aggregates, persisted as JSON."""
+
+    def __init__(self, path: str = USAGE_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._data = self._load()
+
+    def _load(self) -> Dict:
+        data = {dimension: {} for dimension in DIMENSIONS}
+        data['runs'] = []
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    data.update(json.load(f))
+            except (OSError, ValueError):
+                pass
+        return data
+
+    def _buckets(self, labels: Dict[str, Optional[str]]) -> List[Dict]:
+        return [
+            self._data[dimension].setdefault(value, _empty_bucket())
+            for dimension, value in labels.items() if value
+        ]
+
+    def start_run(self, niche: str) -> str:
+        """Open a new run and return its ID."""
+        run_id = uuid.uuid4().hex[:12]
+        with self._lock:
+            bucket = self._data['run'].setdefault(run_id, _empty_bucket())
+            bucket.update(started_at=datetime.now().isoformat(), niche=niche)
+        return run_id
+
+    def finish_run(self, run_id: str) -> Dict:
+        """Close a run, persist all aggregates and return the run's totals."""
+        with self._lock:
+            bucket = self._data['run'].get(run_id, _empty_bucket())
+            bucket['finished_at'] = datetime.now().isoformat()
+            if run_id not in self._data['runs']:
+                self._data['runs'].append(run_id)
+            # Forget the oldest runs
+            for old_run in self._data['runs'][:-MAX_RUNS]:
+                self._data['run'].pop(old_run, None)
+            del self._data['runs'][:-MAX_RUNS]
+            self._save()
+            return dict(bucket, run_id=run_id)
+
+    def _save(self) -> None:
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._data, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def record_call(self, provider: str, model_name: str, niche: str, channel_ids: Iterable[Optional[str]],
+                    latency: float, prompt_tokens: int, completion_tokens: int,
+                    run_id: Optional[str] = None) -> None:
+        """
+        Record one provider call that served one or more videos.
+
+        Channel totals get an equal share of a batched call's tokens and cost.
+        """
+        channel_ids = list(channel_ids) or [None]
+        cost = estimate_cost(model_name, prompt_tokens, completion_tokens)
+        share = 1 / len(channel_ids)
+
+        with self._lock:
+            for bucket in self._buckets({'run': run_id, 'niche': niche, 'provider': provider}):
+                self._add_call(bucket, 1, latency, prompt_tokens, completion_tokens, cost)
+            for channel_id in channel_ids:
+                for bucket in self._buckets({'channel': channel_id}):
+                    self._add_call(bucket, share, latency, prompt_tokens * share, completion_tokens * share,
+                                   cost * share)
+
+    @staticmethod
+    def _add_call(bucket: Dict, calls: float, latency: float, prompt_tokens: float,
+                  completion_tokens: float, cost: float) -> None:
+        bucket['calls'] += calls
+        bucket['prompt_tokens'] += prompt_tokens
+        bucket['completion_tokens'] += completion_tokens
+        bucket['cost_usd'] += cost
+        bucket['latency_total'] += latency * calls
+        bucket['latency_max'] = max(bucket['latency_max'], latency)
+
+    def record_item(self, niche: str, channel_id: Optional[str], run_id: Optional[str] = None,
+                    cache_hit: bool = False, retries: int = 0, fallback: bool = False,
+                    failed: bool = False, provider: Optional[str] = None) -> None:
+        """
+        Record the outcome for one video.
+
+        Args:
+            niche: Business niche of the request
+            channel_id: Channel the video belongs to
+            run_id: Run from start_run
+            cache_hit: Served from the summary cache
+            retries: Provider calls beyond the first one
+            fallback: Answered by a provider other than the requested one
+            failed: No provider answered and a placeholder was used
+            provider: Provider that answered
+        """
+        with self._lock:
+            labels = {'run': run_id, 'channel': channel_id, 'niche': niche, 'provider': provider}
+            for bucket in self._buckets(labels):
+                bucket['items'] += 1
+                bucket['cache_hits'] += int(cache_hit)
+                bucket['retries'] += retries
+                bucket['fallbacks'] += int(fallback)
+                bucket['failures'] += int(failed)
+
+    def summary(self, dimension: str) -> Dict[str, Dict]:
+        """Aggregates for one of 'run', 'channel', 'niche' or 'provider', with average latency."""
+        with self._lock:
+            buckets = {key: dict(bucket) for key, bucket in self._data[dimension].items()}
+        for bucket in buckets.values():
+            bucket['latency_avg'] = bucket['latency_total'] / bucket['calls'] if bucket['calls'] else 0.0
+        return buckets
+
+    def last_run(self) -> Optional[Dict]:
+        """Totals of the most recently finished run."""
+        with self._lock:
+            if not self._data['runs']:
+                return None
+            run_id = self._data['runs'][-1]
+        return dict(self.summary('run').get(run_id, _empty_bucket()), run_id=run_id)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data = {dimension: {} for dimension in DIMENSIONS}
+            self._data['runs'] = []
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+
+_tracker: Optional[UsageTracker] = None
+_tracker_lock = threading.Lock()
+
+
+def get_usage_tracker() -> UsageTracker:
+    """Return the process-wide usage tracker."""
+    global _tracker
+    with _tracker_lock:
+        if _tracker is None:
+            _tracker = UsageTracker()
+        return _tracker
@@ -2,13 +2,263 @@
 YouTube Data API service for fetching channel videos.
 """
 import os
+import json
+import threading
+from collections import Counter
 from typing import List, Dict, Optional
+import httplib2
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 import streamlit as st
+from services.post_store import parse_timestamp
+from services.text_compaction import compact_channel_texts, record_compaction
 
+# videos.list and playlistItems.list return at most 50 items per call
+VIDEOS_PER_BATCH = 50
 
-def fetch_youtube(channel_id: str, api_key: str, max_results: int = 3) -> List[Dict]:
+# Quota units charged per call (YouTube Data API v3)
+QUOTA_COSTS = {
+    'search.list': 100,
+    'videos.list': 1,
+    'channels.list': 1,
+    'playlistItems.list': 1,
+}
+
+# Characters of title + description sent for AI analysis
+MAX_TEXT_CHARS = 2000
+
+# "search" uses search.list (100 units per call, the default),
+# "playlist" pages the channel's uploads playlist (1 unit per call)
+FETCH_MODES = ("search", "playlist")
+
+PLAYLIST_CACHE_FILE = 'data/youtube_playlists.json'
+
+_clients: Dict[str, object] = {}
+_clients_lock = threading.Lock()
+_thread_local = threading.local()
+
+_quota_used = Counter()
+_quota_lock = threading.Lock()
+
+_uploads_playlists: Optional[Dict[str, str]] = None
+_playlists_lock = threading.Lock()
+
+
+def get_youtube_client(api_key: str):
+    """
+    Return a YouTube API client for `api_key`, built once per process.
+
+    The discovery document is parsed only on the first call. Requests must be
+    sent with `_execute` so each thread uses its own HTTP connection.
+    """
+    with _clients_lock:
+        client = _clients.get(api_key)
+        if client is None:
+            client = build('youtube', 'v3', developerKey=api_key, cache_discovery=False)
+            _clients[api_key] = client
+        return client
+
+
+def _execute(request, method: str) -> Dict:
+    """
+    Execute an API request and record its quota cost.
+
+    Each thread uses its own keep-alive connection (httplib2 isn't thread-safe).
+    """
+    http = getattr(_thread_local, 'http', None)
+    if http is None:
+        http = httplib2.Http(timeout=30)
+        _thread_local.http = http
+    
+    with _quota_lock:
+        _quota_used[method] += 1
+    return request.execute(http=http)
+
+
+def get_quota_usage() -> Dict:
+    """
+    Quota units spent by this process.
+    
+    Returns:
+        Dictionary with total units, units per method and call counts per method
+    """
+    with _quota_lock:
+        calls = dict(_quota_used)
+    units = {method: count * QUOTA_COSTS.get(method, 1) for method, count in calls.items()}
+    return {
+        'total_units': sum(units.values()),
+        'units_by_method': units,
+        'calls_by_method': calls
+    }
+
+
+def reset_quota_usage() -> None:
+    """Reset the quota counters."""
+    with _quota_lock:
+        _quota_used.clear()
+
+
+def _load_playlist_cache() -> Dict[str, str]:
+    global _uploads_playlists
+    if _uploads_playlists is None:
+        _uploads_playlists = {}
+        if os.path.exists(PLAYLIST_CACHE_FILE):
+            try:
+                with open(PLAYLIST_CACHE_FILE, 'r', encoding='utf-8') as f:
+                    _uploads_playlists = json.load(f)
+            except (OSError, ValueError):
+                pass
+    return _uploads_playlists
+
+
+def get_uploads_playlist_id(youtube, channel_id: str) -> Optional[str]:
+    """
+    Resolve a channel's uploads playlist, caching the result on disk.
+    
+    Args:
+        youtube: Client from get_youtube_client
+        channel_id: YouTube channel ID (UC...)
+        
+    Returns:
+        Uploads playlist ID, or None if the channel doesn't exist
+    """
+    with _playlists_lock:
+        playlist_id = _load_playlist_cache().get(channel_id)
+    if playlist_id:
+        return playlist_id
+    
+    response = _execute(youtube.channels().list(part="contentDetails", id=channel_id), 'channels.list')
+    items = response.get('items', [])
+    if not items:
+        return None
+    playlist_id = items[0]['contentDetails']['relatedPlaylists']['uploads']
+    
+    with _playlists_lock:
+        playlists = _load_playlist_cache()
+        playlists[channel_id] = playlist_id
+        os.makedirs(os.path.dirname(PLAYLIST_CACHE_FILE), exist_ok=True)
+        with open(PLAYLIST_CACHE_FILE, 'w', encoding='utf-8') as f:
+            json.dump(playlists, f, indent=2)
+    return playlist_id
+
+
+def fetch_video_details(youtube, video_ids: List[str]) -> Dict[str, Dict]:
+    """
+    Fetch snippets for many videos with as few videos.list calls as possible.
+
+    Args:
+        youtube: Client from get_youtube_client
+        video_ids: Video IDs to look up
+
+    Returns:
+        Dictionary mapping video ID to its snippet
+    """
+    details = {}
+    for start in range(0, len(video_ids), VIDEOS_PER_BATCH):
+        batch = video_ids[start:start + VIDEOS_PER_BATCH]
+        response = _execute(youtube.videos().list(
+            part="snippet",
+            id=",".join(batch)
+        ), 'videos.list')
+        for item in response.get('items', []):
+            details[item['id']] = item['snippet']
+    return details
+
+
+def _is_known(video_id: str, published_at: str, since: Optional[Dict]) -> bool:
+    """Check whether a video is at or behind a channel's high-water mark."""
+    if not since:
+        return False
+    if video_id == since.get('post_id'):
+        return True
+    published = parse_timestamp(published_at)
+    mark = parse_timestamp(since.get('published_at'))
+    return published is not None and mark is not None and published < mark
+
+
+def _search_videos(youtube, channel_id: str, max_results: int, since: Optional[Dict] = None) -> List[Dict]:
+    """Latest videos via search.list plus a batched videos.list (101 quota units)."""
+    params = {}
+    if since and since.get('published_at'):
+        params['publishedAfter'] = since['published_at']
+    
+    search_response = _execute(youtube.search().list(
+        part="snippet",
+        channelId=channel_id,
+        order="date",
+        type="video",
+        maxResults=max_results,
+        **params
+    ), 'search.list')
+    
+    items = []
+    for item in search_response.get('items', []):
+        # Results are newest first, so stop at the first known video
+        if _is_known(item['id']['videoId'], item['snippet']['publishedAt'], since):
+            break
+        items.append(item)
+    
+    if not items:
+        return []
+    
+    # Get all video descriptions in one batched call
+    details = fetch_video_details(youtube, [item['id']['videoId'] for item in items])
+    
+    return [
+        {
+            'video_id': item['id']['videoId'],
+            'title': item['snippet']['title'],
+            'published_at': item['snippet']['publishedAt'],
+            'description': details.get(item['id']['videoId'], {}).get('description', ''),
+            'channel_title': item['snippet'].get('channelTitle', 'Unknown Channel')
+        }
+        for item in items
+    ]
+
+
+def _playlist_videos(youtube, channel_id: str, max_results: int, since: Optional[Dict] = None) -> List[Dict]:
+    """Latest videos from the channel's uploads playlist (1 quota unit per page)."""
+    playlist_id = get_uploads_playlist_id(youtube, channel_id)
+    if not playlist_id:
+        st.error(f"❌ Invalid channel ID: {channel_id}")
+        return []
+    
+    videos = []
+    page_token = None
+    while len(videos) < max_results:
+        response = _execute(youtube.playlistItems().list(
+            part="snippet,contentDetails",
+            playlistId=playlist_id,
+            maxResults=min(max_results - len(videos), VIDEOS_PER_BATCH),
+            pageToken=page_token
+        ), 'playlistItems.list')
+        
+        for item in response.get('items', []):
+            content = item.get('contentDetails', {})
+            # Private and deleted videos have no publish date
+            if not content.get('videoPublishedAt'):
+                continue
+            # Uploads are listed newest first, so stop at the first known video
+            if _is_known(content['videoId'], content['videoPublishedAt'], since):
+                return videos[:max_results]
+            snippet = item['snippet']
+            videos.append({
+                'video_id': content['videoId'],
+                'title': snippet['title'],
+                'published_at': content['videoPublishedAt'],
+                'description': snippet.get('description', ''),
+                'channel_title': snippet.get('channelTitle', 'Unknown Channel')
+            })
+        
+        page_token = response.get('nextPageToken')
+        if not page_token:
+            break
+    
+    return videos[:max_results]
+
+
+def fetch_youtube(channel_id: str, api_key: str, max_results: int = 3, mode: str = "search",
+                  since: Optional[Dict] = None, compact: bool = True) -> List[Dict]:
     """
     Fetch latest videos from a YouTube channel.
     
@@ -16,46 +266,42 @@ def fetch_youtube(channel_id: str, api_key: str, max_results: int = 3) -> List[D
         channel_id: YouTube channel ID (UC...)
         api_key: YouTube Data API v3 key
         max_results: Maximum number of videos to fetch
+        mode: "search" (search.list, ~101 quota units) or "playlist" (uploads playlist, ~1 unit)
+        since: Channel high-water mark ({"published_at", "post_id"}); fetching
+            stops at the first video at or before it
+        compact: Strip links, chapter lists, promo lines and channel boilerplate
+            from descriptions before truncating them
         
     Returns:
         List of video dictionaries with post_id, title, url, published_at, raw_text
     """
     try:
-        youtube = build('youtube', 'v3', developerKey=api_key)
+        youtube = get_youtube_client(api_key)
         
-        # Search for videos from the channel
-        search_response = youtube.search().list(
-            part="snippet",
-            channelId=channel_id,
-            order="date",
-            type="video",
-            maxResults=max_results
-        ).execute()
+        if mode == "search":
+            items = _search_videos(youtube, channel_id, max_results, since)
+        else:
+            items = _playlist_videos(youtube, channel_id, max_results, since)
+        
+        descriptions = [item['description'] for item in items]
+        if compact:
+            descriptions = compact_channel_texts(
+                channel_id, [(item['video_id'], item['description']) for item in items]
+            )
         
         videos = []
-        for item in search_response.get('items', []):
-            snippet = item['snippet']
-            
-            # Get video description
-            video_response = youtube.videos().list(
-                part="snippet",
-                id=item['id']['videoId']
-            ).execute()
-            
-            description = ""
-            if video_response.get('items'):
-                description = video_response['items'][0]['snippet'].get('description', '')
-            
+        for item, description in zip(items, descriptions):
             # Combine title and description for AI analysis
-            raw_text = f"{snippet['title']}\n\n{description}"[:2000]
+            raw_text = f"{item['title']}\n\n{description}".strip()[:MAX_TEXT_CHARS]
+            record_compaction(f"{item['title']}\n\n{item['description']}"[:MAX_TEXT_CHARS], raw_text)
             
             video_data = {
-                'post_id': item['id']['videoId'],
-                'title': snippet['title'],
-                'url': f"https://www.youtube.com/watch?v={item['id']['videoId']}",
-                'published_at': snippet['publishedAt'],
+                'post_id': item['video_id'],
+                'title': item['title'],
+                'url': f"https://www.youtube.com/watch?v={item['video_id']}",
+                'published_at': item['published_at'],
                 'raw_text': raw_text,
-                'channel_title': snippet.get('channelTitle', 'Unknown Channel')
+                'channel_title': item['channel_title']
             }
             videos.append(video_data)
             
@@ -64,7 +310,7 @@ def fetch_youtube(channel_id: str, api_key: str, max_results: int = 3) -> List[D
     except HttpError as e:
         if e.resp.status == 403:
             st.error(f"❌ YouTube API quota exceeded or invalid API key for channel {channel_id}")
-        elif e.resp.status == 400:
+        elif e.resp.status in (400, 404):
             st.error(f"❌ Invalid channel ID: {channel_id}")
         else:
             st.error(f"❌ YouTube API error: {e}")